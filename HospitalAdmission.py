@@ -9,8 +9,9 @@ Models:
 Model 4 - hospital sequentiality: hospital admission are decided by the order of being symptomatic.
 
 Model 5 - hospital severity: hospital admission are decided by the order of possible time of getting infected.
+The patients wait for a bed in the waiting list of hospital.py, admitted as soon as beds are free.
 Assumed the possible earliest infected day is that the earliest day of contact with infected person in the touch history
- list which saved in 'touch_history' attribution of nodes / persons. 
+ list which saved in 'touch_history' of the population. 
 
 Inputs:
 n - The number of nodes in network / the number of persons in society.
@@ -18,6 +19,13 @@ density - edges density.
 d1 - the density of patients.
 d2 - the density of asymptomatical virus carriers.
 crowd_num - the range of the number of crowds/clusters.
+coef - coefficients of the virus, keyword arguments of epidemic.virus, e.g. {'hidden_day': 14, 'death': 51}.
+recorder - optional recorder.recorder, the numbers of every day are appended to it.
+           A trajectory.trajectoryWriter keeps the state of every person of every day on disk instead.
+seed - seed of the random numbers of a run, an int or a numpy SeedSequence, None: a new run every time.
+profiler - optional profiler.profiler, the time of the phases of update() and their counters.
+replicas - K independent replicates of the model stepped together as one population of K * n persons, the
+           ensembles of batch.py. The counters of the virus are the sums over the replicas.
 r - rate of volume of the hospital over population of society.
 
 Example:
@@ -36,11 +44,11 @@ Created on Thu May  7 23:00:51 2020
 @author: Qiyang Ma
 """
 
-import pycxsimulator
-import random as rd
-import matplotlib.pyplot as plt
-import networkx as nx
+import numpy as np
 import epidemic as ed
+import layout as ly
+import renderer as rn
+import hospital as hs
 
 # basic parameters
 n = 300
@@ -50,216 +58,206 @@ d2 = 0.1 # the density of asymptomatical virus carriers
 crowd_num = [ 10, 20 ] # the range of the number of crowds/clusters
 r = 0.05 # rate of volume of the hospital over population of society, assume hospital can accommodate 5% of the total humans
 v = int( 300 * 0.05 ) # volume of the hospital
+coef = {} # coefficients of the virus, default ones of epidemic.virus
 
 
 # Model 4
 # hospital sequentiality - hospital admission are decided by the order of being symptomatic.
 class hospital_sequentiality:
-    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num, v = v):
+    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num, v = v, coef = coef, recorder = None, seed = None, profiler = None, replicas = 1):
         self.n = n
         self.density = density
         self.d1 = d1
         self.d2 = d2
         self.crowd_num = crowd_num
         self.v = v
+        self.coef = coef
+        self.recorder = recorder
+        self.seed = seed
+        self.profiler = profiler
+        self.replicas = replicas
     
     def initialize(self):
-        global g, daynum, virus
-        global num # the number of patients in hospitals
-        daynum = 0
-        virus = ed.virus()
-        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus)
-        g = ed.createEdges(g, daynum, self.density, virus)
-        num = 0
+        virus = ed.virus(**self.coef)
+        rng = np.random.default_rng(self.seed) # the same seed gives the same run
+        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus, rng, self.replicas)
+        g = ed.createEdges(g, 0, self.density, virus, rng)
+        self.world = ed.world(g, virus, hospital = hs.create(self.v, self.n, self.replicas), recorder = self.recorder, rng = rng, profiler = self.profiler)
+        self.layout = ly.layout(crowds = self.crowd_num[1]) # positions kept across days
+        self.renderer = rn.renderer() # artists kept across days
+        sick = g.symptomatic.ids
+        self.world.hospital.wait(sick, np.zeros(len(sick))) # waiting in the order of being symptomatic
+        self.world.record() # day 0
         
-    def observe(self):
-        global g, daynum, virus
-        global num
-
-        plt.cla()
-        layout = nx.spring_layout(g)
-        nx.draw( g, node_color = [g.nodes[i]['color'] for i in g.nodes], node_size = 20, pos = layout)
-        t = 'persons: ' + str(n) + ', heathy: ' + str(virus.hnum) + ', sick: ' + str(virus.pnum) \
-                + ', recovery: ' + str(virus.rnum) + ', death: ' + str(virus.dnum) + ' - day: ' + str(daynum) 
-        plt.title(t, fontsize = 10, fontfamily = 'Times New Roman')
+    def snapshot(self):
+        return ed.snapshot(self.world)
+    
+    def observe(self, s = None):
+        if s is None: # drawn from the model itself, not from a worker snapshot
+            s = self.snapshot()
+        t = 'persons: ' + str(n) + ', heathy: ' + str(s.hnum) + ', sick: ' + str(s.pnum) \
+                + ', recovery: ' + str(s.rnum) + ', death: ' + str(s.dnum) + ' - day: ' + str(s.daynum) 
+        self.renderer.draw(s, self.layout.positions(s), t)
     
     def update(self):
-        global g, daynum, virus
-        global num
-        
-        daynum += 1
+        w = self.world
+        g, virus, rng = w.g, w.virus, w.rng
+        w.daynum += 1
+        daynum = w.daynum
+        w.tick() # a new day for the profiler
         # update links
-        g = ed.updateLinks(g, self.density, self.crowd_num)
+        g = ed.updateLinks(g, daynum, self.density, self.crowd_num, virus, rng)
+        w.tick('relink', contacts = len(g.edges))
         
         # update infection
-        g = ed.updateInfected(g, virus)
+        healthy = len(g.susceptible)
+        g = ed.updateInfected(g, virus, rng)
+        w.tick('infection', infections = healthy - len(g.susceptible))
         
         # not update order to hospital
-        for i in g.nodes:
-            if g.nodes[i]['state'] >= 1:
-                if num <= v:
-                    g.nodes[i]['hospital'] = 1
-                    g.nodes[i]['isolation'] = 1
-                    g.nodes[i]['color'] = 'k'
-                    num += 1
+        h = w.hospital
+        h.fill(g)
+        w.tick('admission')
         
         # update state
-        g2 = g.copy()
-        for i in g2.nodes:
-            if g.nodes[i]['state'] == 0:
-                if g.nodes[i]['real'] >= 1:
-                    g.nodes[i]['real'] += 1
-                if rd.random() < virus.explicit_prob(g.nodes[i]['real']):
-                    g.nodes[i]['state'] = g.nodes[i]['real']
-                    g.nodes[i]['color'] = 'r'
-                    if num <= v:
-                        g.nodes[i]['hospital'] = 1
-                        g.nodes[i]['isolation'] = 1
-                        g.nodes[i]['color'] = 'k'
-                        num += 1
-            if g.nodes[i]['state'] >= 1:
-                if g.nodes[i]['hospital'] == 1:
-                    if rd.random() < virus.recovery_prob(g.nodes[i]['state'], hos = 1):
-                        g.nodes[i][ 'state' ] = 0.5 # The sick person recovered
-                        g.nodes[i][ 'real' ] = 0.5
-                        g.nodes[i][ 'color' ] = 'g'
-                        g.nodes[i][ 'hospital' ] = 0
-                        g.nodes[ i ][ 'isolation' ] = 0
-                        num -= 1
-                        virus.rnum += 1
-                        virus.pnum -= 1
-                        continue
-                    if rd.random() < virus.death_prob(g.nodes[i][ 'state' ], hos = 1):
-                        g.remove_node(i) # The sick person has probability to die
-                        num -= 1
-                        virus.dnum += 1
-                        virus.pnum -= 1
-                        continue
-                else:
-                    if rd.random() < virus.recovery_prob(g.nodes[i]['state']):
-                        g.nodes[i]['state'] = 0.5 # The sick person recovered
-                        g.nodes[i]['real'] = 0.5
-                        g.nodes[i]['color'] = 'g'
-                        virus.rnum += 1
-                        virus.pnum -= 1
-                        continue
-                    if rd.random() < virus.death_prob(g.nodes[i]['state']):
-                        g.remove_node(i) # The sick person has probability to die  
-                        virus.dnum += 1
-                        virus.pnum -= 1
-                        continue
-                    if num <= v:
-                        g.nodes[i]['hospital'] = 1
-                        g.nodes[i]['isolation'] = 1
-                        num += 1
-    def run(self):
-        pycxsimulator.GUI().start(func = [self.initialize, self.observe, self.update])
+        carrier = g.carriers.ids
+        g.real[carrier] += 1
+        explicit = carrier[rng.random(len(carrier)) < virus.explicit_prob(g.real[carrier])]
+        g.state[explicit] = g.real[explicit]
+        g.color[explicit] = 'r'
+        g.classify(explicit, ed.HEALTH)
+        w.tick('progression')
+        h.wait(explicit, np.full(len(explicit), daynum))
+        h.fill(g)
+        w.tick('admission')
+        
+        sick = g.symptomatic.ids
+        hos = g.hospital[sick] == 1
+        state = g.state[sick]
+        recovered = rng.random(len(sick)) < np.where(hos, virus.recovery_prob(state, hos = 1), virus.recovery_prob(state))
+        died = ~recovered & (rng.random(len(sick)) < np.where(hos, virus.death_prob(state, hos = 1), virus.death_prob(state)))
+        rec = sick[recovered]
+        h.discharge(g, sick[recovered | died])
+        h.leave(sick[~hos & (recovered | died)])
+        g.state[rec] = 0.5 # The sick person recovered
+        g.real[rec] = 0.5
+        g.color[rec] = 'g'
+        g.classify(rec, ed.HEALTH)
+        w.tick('outcome')
+        g.removeNodes(sick[died]) # The sick person has probability to die
+        w.tick('removal', removed = int(np.count_nonzero(died)))
+        h.fill(g)
+        w.tick('admission')
+        w.record()
+    
+    def run(self, worker = False):
+        # worker - step the model on a background thread, the window draws the latest snapshot
+        # the shares of the phases are shown in the status bar when the model has a profiler
+        import pycxsimulator # Tk and matplotlib are loaded only for the GUI
+        status = self.profiler.summary if self.profiler is not None else None
+        pycxsimulator.GUI(worker = worker, statusFunc = status).start(func = [self.initialize, self.observe, self.update, self.snapshot])
 
 
 # Model 5
 # hospital severity - hospital admission are decided by the order of possible time of getting infected.
 class hospital_severity:
-    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num, v = v):
+    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num, v = v, coef = coef, recorder = None, seed = None, profiler = None, replicas = 1):
         self.n = n
         self.density = density
         self.d1 = d1
         self.d2 = d2
         self.crowd_num = crowd_num
         self.v = v
+        self.coef = coef
+        self.recorder = recorder
+        self.seed = seed
+        self.profiler = profiler
+        self.replicas = replicas
         
     def initialize(self):
-        global g, daynum, virus
-        global num
-        daynum = 0
-        virus = ed.virus()
-        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus)
-        g = ed.createEdges(g, daynum, self.density, virus)
-        num = 0
+        virus = ed.virus(**self.coef)
+        rng = np.random.default_rng(self.seed) # the same seed gives the same run
+        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus, rng, self.replicas)
+        g = ed.createEdges(g, 0, self.density, virus, rng)
+        self.world = ed.world(g, virus, hospital = hs.create(self.v, self.n, self.replicas), recorder = self.recorder, rng = rng, profiler = self.profiler)
+        self.layout = ly.layout(crowds = self.crowd_num[1]) # positions kept across days
+        self.renderer = rn.renderer() # artists kept across days
+        sick = g.symptomatic.ids
+        self.world.hospital.wait(sick, -g.state[sick]) # the longer ill, the earlier in hospital
+        self.world.record() # day 0
 
-    def observe(self):
-        global g, daynum, virus
-        global num    
-        plt.cla()
-        layout = nx.spring_layout(g)
-        nx.draw( g, node_color = [g.nodes[i]['color'] for i in g.nodes], node_size = 20, pos = layout)
-        t = 'persons: ' + str(n) + ', heathy: ' + str( virus.hnum ) + ', sick: ' + str(virus.pnum) \
-                + ', recovery: ' + str(virus.rnum) + ', death: ' + str(virus.dnum) + ' - day: ' + str(daynum) 
-        plt.title(t, fontsize = 10, fontfamily = 'Times New Roman')
+    def snapshot(self):
+        return ed.snapshot(self.world)
+    
+    def observe(self, s = None):
+        if s is None: # drawn from the model itself, not from a worker snapshot
+            s = self.snapshot()
+        t = 'persons: ' + str(n) + ', heathy: ' + str( s.hnum ) + ', sick: ' + str(s.pnum) \
+                + ', recovery: ' + str(s.rnum) + ', death: ' + str(s.dnum) + ' - day: ' + str(s.daynum) 
+        self.renderer.draw(s, self.layout.positions(s), t)
     
     def update(self):
-        global g, daynum, virus
-        global num
-        
-        daynum += 1
+        w = self.world
+        g, virus, rng = w.g, w.virus, w.rng
+        w.daynum += 1
+        daynum = w.daynum
+        w.tick() # a new day for the profiler
         # update links
-        g = ed.updateLinks(g, self.density, self.crowd_num)
+        g = ed.updateLinks(g, daynum, self.density, self.crowd_num, virus, rng)
+        w.tick('relink', contacts = len(g.edges))
         
         # update infection
-        g = ed.updateInfected(g, virus)
+        healthy = len(g.susceptible)
+        g = ed.updateInfected(g, virus, rng)
+        w.tick('infection', infections = healthy - len(g.susceptible))
     
         # update hospital order
-        order = []
-        g2 = g.copy()
-        for i in g2.nodes:
-            if g.nodes[i]['state'] == 0:
-                if g.nodes[i]['real'] >= 1:
-                    g.nodes[i]['real'] += 1
-                    if rd.random() < virus.explicit_prob(g.nodes[i]['real']):
-                        g.nodes[ i ][ 'state' ] = g.nodes[i]['hos_order']
-                        order.append((i, g.nodes[i]['state']))
-            if g.nodes[i]['state'] >= 1:
-                for key in g.nodes[i]['touch_history']:
-                    touches = set(g.nodes[i]['touch_history'][key])
-                    for p in touches:
-                        if p in g.nodes:
-                            tmp = daynum % virus.hidden_day - key if daynum % virus.hidden_day > key \
-                                    else virus.hidden_day - key + daynum % virus.hidden_day
-                            g.nodes[p]['hos_order'] = max(g.nodes[p]['hos_order'], tmp)
-                if g.nodes[i]['hospital'] == 1:
-                    g.nodes[i]['isolation'] = 1
-                    g.nodes[i]['color'] = 'k'
-                    if rd.random() < virus.recovery_prob(g.nodes[i]['state'], hos = 1):
-                        g.nodes[i]['state'] = 0.5 # The sick person recovered
-                        g.nodes[i]['real'] = 0.5
-                        g.nodes[i]['hospital'] = 0
-                        g.nodes[i]['color'] = 'g'
-                        g.nodes[i]['isolation'] = 0
-                        num -= 1
-                        virus.rnum += 1
-                        virus.pnum -= 1
-                        continue
-                    if rd.random() < virus.death_prob(g.nodes[i]['state'], hos = 1):
-                        g.remove_node(i) # The sick person has probability to die
-                        num -= 1
-                        virus.dnum += 1
-                        virus.pnum -= 1
-                        continue
-                else:
-                    order.append((i, g.nodes[i]['state']))
-                    if rd.random() < virus.recovery_prob(g.nodes[i]['state']):
-                        g.nodes[i]['state'] = 0.5 # The sick person recovered
-                        g.nodes[i]['real'] = 0.5
-                        g.nodes[i]['color'] = 'g'
-                        virus.rnum += 1
-                        virus.pnum -= 1
-                        continue
-                    if rd.random() < virus.death_prob(g.nodes[i]['state']):
-                        g.remove_node(i) # The sick person has probability to die
-                        virus.dnum += 1
-                        virus.pnum -= 1
-                        continue
-                g.nodes[i]['state'] += 1
-                g.nodes[i]['real'] += 1
+        # the waiting list is keyed by daynum - state, the longest ill first: every waiting patient gets one day
+        # older each day, so the order of the list only changes by the newly symptomatic patients
+        h = w.hospital
+        carrier = g.carriers.ids
+        g.real[carrier] += 1
+        explicit = carrier[rng.random(len(carrier)) < virus.explicit_prob(g.real[carrier])]
+        g.state[explicit] = g.hos_order[explicit]
+        g.classify(explicit, ed.HEALTH)
+        explicit = explicit[g.state[explicit] >= 1]
+        h.wait(explicit, daynum - g.state[explicit])
+        w.tick('progression')
+        
+        sick = g.symptomatic.ids
+        contacts, since = g.touch_history.trace(sick, daynum, 'max', virus.hidden_day)
+        keep = g.alive[contacts]
+        contacts, since = contacts[keep], since[keep]
+        g.hos_order[contacts] = np.maximum(g.hos_order[contacts], since)
+        w.tick('tracing', traced = len(contacts))
+        
+        hos = g.hospital[sick] == 1
+        state = g.state[sick]
+        recovered = rng.random(len(sick)) < np.where(hos, virus.recovery_prob(state, hos = 1), virus.recovery_prob(state))
+        died = ~recovered & (rng.random(len(sick)) < np.where(hos, virus.death_prob(state, hos = 1), virus.death_prob(state)))
+        rec = sick[recovered]
+        h.discharge(g, sick[recovered | died])
+        h.leave(sick[~hos & (recovered | died)])
+        g.state[rec] = 0.5 # The sick person recovered
+        g.real[rec] = 0.5
+        g.color[rec] = 'g'
+        g.classify(rec, ed.HEALTH)
+        w.tick('outcome')
+        g.removeNodes(sick[died]) # The sick person has probability to die
+        w.tick('removal', removed = int(np.count_nonzero(died)))
+        rest = sick[~recovered & ~died]
+        g.state[rest] += 1
+        g.real[rest] += 1
+        w.tick('progression')
         
         #update order
-        order = sorted(order, key = lambda x: x[1], reverse = True)
-        n = 0
-        while num <= v:
-            i = order[n][0]
-            if i in g.nodes:
-                g.nodes[i]['hospital'] = 1
-                num += 1
-            n += 1
+        h.fill(g)
+        w.tick('admission')
+        w.record()
     
-    def run(self):
-        pycxsimulator.GUI().start(func = [self.initialize, self.observe, self.update])
+    def run(self, worker = False):
+        # worker - step the model on a background thread, the window draws the latest snapshot
+        # the shares of the phases are shown in the status bar when the model has a profiler
+        import pycxsimulator # Tk and matplotlib are loaded only for the GUI
+        status = self.profiler.summary if self.profiler is not None else None
+        pycxsimulator.GUI(worker = worker, statusFunc = status).start(func = [self.initialize, self.observe, self.update, self.snapshot])
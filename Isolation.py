@@ -11,7 +11,7 @@ Model 1 - completely isolation: Everyone is immediately isolated from each other
 Model 2 - partially isolation: After sick, isolated from the outside world.
 
 Model 3 - timely isolation: The patients and the people who are in his or her touch history list will be isolated as well.
-The touch history list is saved in 'touch_history' attribution of nodes.
+The touch history list is saved in 'touch_history' of the population.
 
 Inputs:
 n - The number of nodes in network / the number of persons in society.
@@ -19,6 +19,13 @@ density - edges density.
 d1 - the density of patients.
 d2 - the density of asymptomatical virus carriers.
 crowd_num - the range of the number of crowds/clusters.
+coef - coefficients of the virus, keyword arguments of epidemic.virus, e.g. {'hidden_day': 14, 'death': 51}.
+recorder - optional recorder.recorder, the numbers of every day are appended to it.
+           A trajectory.trajectoryWriter keeps the state of every person of every day on disk instead.
+seed - seed of the random numbers of a run, an int or a numpy SeedSequence, None: a new run every time.
+profiler - optional profiler.profiler, the time of the phases of update() and their counters.
+replicas - K independent replicates of the model stepped together as one population of K * n persons, the
+           ensembles of batch.py. The counters of the virus are the sums over the replicas.
 
 Examples:
 n = 300, density = 2, d1 = 0.1, d2 = 0.1, crowd_num = [ 10, 20 ].
@@ -42,11 +49,10 @@ Created on Wed May  6 17:35:10 2020
 @author: Qiyang Ma
 """
 
-import pycxsimulator
-import random as rd
-import matplotlib.pyplot as plt
-import networkx as nx
+import numpy as np
 import epidemic as ed
+import layout as ly
+import renderer as rn
 
 # basic parameters
 n = 300 # The number of nodes
@@ -54,213 +60,264 @@ density = 2 # edges density
 d1 = 0.1 # the density of patients
 d2 = 0.1 # the density of asymptomatical virus carriers
 crowd_num = [10, 20] # the range of the number of crowds/clusters
+coef = {} # coefficients of the virus, default ones of epidemic.virus
 
 # Model 1
 # Completely isolation - Everyone is immediately isolated from each other
 class complete_isolation:
-    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num):
+    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num, coef = coef, recorder = None, seed = None, profiler = None, replicas = 1):
         self.n = n
         self.density = density
         self.d1 = d1
         self.d2 = d2
         self.crowd_num = crowd_num
+        self.coef = coef
+        self.recorder = recorder
+        self.seed = seed
+        self.profiler = profiler
+        self.replicas = replicas
     
     def initialize(self):
-        global g, daynum, virus        
-        daynum = 0
-        g = nx.Graph()
-        virus = ed.virus()
-        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus)
-        g = ed.createEdges(g, daynum, self.density, virus)
+        virus = ed.virus(**self.coef)
+        rng = np.random.default_rng(self.seed) # the same seed gives the same run
+        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus, rng, self.replicas)
+        g = ed.createEdges(g, 0, self.density, virus, rng)
+        self.world = ed.world(g, virus, recorder = self.recorder, rng = rng, profiler = self.profiler)
+        self.layout = ly.layout(crowds = self.crowd_num[1]) # positions kept across days
+        self.renderer = rn.renderer() # artists kept across days
+        self.world.record() # day 0
     
-    def observe(self):
-        global g, daynum, virus        
-        plt.cla()
-        layout = nx.spring_layout(g)
-        nx.draw(g, node_color = [g.nodes[i]['color'] for i in g.nodes], node_size = 20, pos = layout)
-        t = 'persons: ' + str(self.n) + ', heathy: ' + str(virus.hnum) + ', sick: ' + str(virus.pnum) \
-                + ', recovery: ' + str(virus.rnum) + ', death: ' + str(virus.dnum) + ' - day: ' + str(daynum) 
-        plt.title(t, fontsize = 10, fontfamily = 'Times New Roman')
+    def snapshot(self):
+        return ed.snapshot(self.world)
+    
+    def observe(self, s = None):
+        if s is None: # drawn from the model itself, not from a worker snapshot
+            s = self.snapshot()
+        t = 'persons: ' + str(self.n) + ', heathy: ' + str(s.hnum) + ', sick: ' + str(s.pnum) \
+                + ', recovery: ' + str(s.rnum) + ', death: ' + str(s.dnum) + ' - day: ' + str(s.daynum) 
+        self.renderer.draw(s, self.layout.positions(s), t)
     
     def update(self):
-        global g, daynum, virus
-        daynum += 1
+        w = self.world
+        g, virus, rng = w.g, w.virus, w.rng
+        w.daynum += 1
+        daynum = w.daynum
+        w.tick() # a new day for the profiler
+        
+        g.clearEdges()
+        carrier = np.concatenate([g.carriers.ids, g.symptomatic.ids])
+        carrier = carrier[g.real[carrier] >= 1] # the sick ones of day 0 as well
+        g.state[carrier] = g.real[carrier]
+        g.real[carrier] = 0
+        g.classify(carrier, ed.HEALTH)
+        w.tick('progression')
         
-        for i in g.nodes:
-            for j in list(g.neighbors(i)):
-                g.remove_edge(i, j)
-            if g.nodes[i]['real'] >= 1:
-                g.nodes[i]['state'] = g.nodes[i]['real']
-                g.nodes[i]['real'] = 0
-        g2 = g.copy()
-        for i in g2.nodes:
-            if g.nodes[i]['state'] >= 1:
-                g.nodes[i]['state'] += 1
-                if rd.random() < virus.recovery_prob(g.nodes[i]['state']):
-                    g.nodes[i]['state'] = 0.5 # The sick person recovered
-                    g.nodes[i]['color'] = 'g'
-                    virus.rnum += 1
-                    virus.pnum -= 1
-                    continue
-                if rd.random() < virus.death_prob(g.nodes[i]['state']):
-                    g.remove_node(i) # The sick person has probability to die
-                    virus.dnum += 1
-                    virus.pnum -= 1
-                    continue
+        sick = g.symptomatic.ids
+        g.state[sick] += 1
+        recovered = rng.random(len(sick)) < virus.recovery_prob(g.state[sick])
+        died = ~recovered & (rng.random(len(sick)) < virus.death_prob(g.state[sick]))
+        g.state[sick[recovered]] = 0.5 # The sick person recovered
+        g.color[sick[recovered]] = 'g'
+        g.classify(sick[recovered], ed.HEALTH)
+        w.tick('outcome')
+        g.removeNodes(sick[died]) # The sick person has probability to die
+        w.tick('removal', removed = int(np.count_nonzero(died)))
+        w.record()
     
-    def run(self):
-        pycxsimulator.GUI().start(func = [self.initialize, self.observe, self.update])
+    def run(self, worker = False):
+        # worker - step the model on a background thread, the window draws the latest snapshot
+        # the shares of the phases are shown in the status bar when the model has a profiler
+        import pycxsimulator # Tk and matplotlib are loaded only for the GUI
+        status = self.profiler.summary if self.profiler is not None else None
+        pycxsimulator.GUI(worker = worker, statusFunc = status).start(func = [self.initialize, self.observe, self.update, self.snapshot])
 
 
 # Model 2
 # Partially isolation - after he or she sicks, isolated from the outside world
 class partial_isolation:
-    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num):
+    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num, coef = coef, recorder = None, seed = None, profiler = None, replicas = 1):
         self.n = n
         self.density = density
         self.d1 = d1
         self.d2 = d2
         self.crowd_num = crowd_num
+        self.coef = coef
+        self.recorder = recorder
+        self.seed = seed
+        self.profiler = profiler
+        self.replicas = replicas
     
     def initialize(self):
-        global g, daynum, virus        
-        daynum = 0
-        g = nx.Graph()
-        virus = ed.virus()
-        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus)
-        g = ed.createEdges(g, daynum, self.density, virus)
+        virus = ed.virus(**self.coef)
+        rng = np.random.default_rng(self.seed) # the same seed gives the same run
+        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus, rng, self.replicas)
+        g = ed.createEdges(g, 0, self.density, virus, rng)
+        self.world = ed.world(g, virus, recorder = self.recorder, rng = rng, profiler = self.profiler)
+        self.layout = ly.layout(crowds = self.crowd_num[1]) # positions kept across days
+        self.renderer = rn.renderer() # artists kept across days
+        self.world.record() # day 0
+    
+    def snapshot(self):
+        return ed.snapshot(self.world)
     
-    def observe(self):
-        global g, daynum, virus        
-        plt.cla()
-        layout = nx.spring_layout(g)
-        nx.draw(g, node_color = [g.nodes[i]['color'] for i in g.nodes], node_size = 20, pos = layout)
-        t = 'persons: ' + str(n) + ', heathy: ' + str(virus.hnum) + ', sick: ' + str(virus.pnum) \
-                + ', recovery: ' + str(virus.rnum) + ', death: ' + str(virus.dnum) + ' - day: ' + str(daynum) 
-        plt.title(t, fontsize = 10, fontfamily = 'Times New Roman')
+    def observe(self, s = None):
+        if s is None: # drawn from the model itself, not from a worker snapshot
+            s = self.snapshot()
+        t = 'persons: ' + str(n) + ', heathy: ' + str(s.hnum) + ', sick: ' + str(s.pnum) \
+                + ', recovery: ' + str(s.rnum) + ', death: ' + str(s.dnum) + ' - day: ' + str(s.daynum) 
+        self.renderer.draw(s, self.layout.positions(s), t)
     
     def update(self):
-        global g, daynum, virus
-        daynum += 1
+        w = self.world
+        g, virus, rng = w.g, w.virus, w.rng
+        w.daynum += 1
+        daynum = w.daynum
+        w.tick() # a new day for the profiler
         
         #update links
-        g = ed.updateLinks(g, self.density, self.crowd_num)
+        g = ed.updateLinks(g, daynum, self.density, self.crowd_num, virus, rng)
+        w.tick('relink', contacts = len(g.edges))
         
         # Update infection
-        g = ed.updateInfected(g, virus)
+        healthy = len(g.susceptible)
+        g = ed.updateInfected(g, virus, rng)
+        w.tick('infection', infections = healthy - len(g.susceptible))
     
-        g2 = g.copy()
         # Update isolation and epidemic information
-        for i in g2.nodes:
-            if g.nodes[i]['state'] == 0:
-                for j in list(g.neighbors(i)):
-                    if g.nodes[j]['state'] >= 1:
-                        g.remove_edge(i, j)
-                if g.nodes[i]['real'] >= 1:
-                    g.nodes[i]['real'] += 1
-                if rd.random() < virus.explicit_prob(g.nodes[i]['real']):
-                    g.nodes[i]['state'] = g.nodes[i]['real']
-                    g.nodes[i]['color'] = 'r'
-            elif g.nodes[i]['state'] >= 1:
-                g.nodes[i]['isolation'] = 1
-                if rd.random() < virus.recovery_prob(g.nodes[i]['real']):
-                    g.nodes[i]['state'] = 0.5 # The sick person recovered
-                    g.nodes[i]['real'] = 0.5
-                    g.nodes[i]['color'] = 'g'
-                    g.nodes[i]['isolation'] = 0
-                    virus.rnum += 1
-                    virus.pnum -= 1
-                    continue
-                if rd.random() < virus.death_prob(g.nodes[i]['real']):
-                    g.remove_node(i) # The sick person has probability to die
-                    virus.dnum += 1
-                    virus.pnum -= 1
-                    continue
-                g.nodes[i]['state'] += 1
-                g.nodes[i]['real'] += 1
+        state = g.state[g.edges]
+        g.removeEdges(((state[:, 0] == 0) & (state[:, 1] >= 1)) | ((state[:, 0] >= 1) & (state[:, 1] == 0)))
+        sick = g.symptomatic.ids
+        
+        carrier = g.carriers.ids
+        g.real[carrier] += 1
+        explicit = carrier[rng.random(len(carrier)) < virus.explicit_prob(g.real[carrier])]
+        g.state[explicit] = g.real[explicit]
+        g.color[explicit] = 'r'
+        g.classify(explicit, ed.HEALTH)
+        
+        w.tick('progression')
+        g.isolation[sick] = 1
+        g.classify(sick, ['isolated'])
+        recovered = rng.random(len(sick)) < virus.recovery_prob(g.real[sick])
+        died = ~recovered & (rng.random(len(sick)) < virus.death_prob(g.real[sick]))
+        rec = sick[recovered]
+        g.state[rec] = 0.5 # The sick person recovered
+        g.real[rec] = 0.5
+        g.color[rec] = 'g'
+        g.isolation[rec] = 0
+        g.classify(rec, ed.HEALTH + ['isolated'])
+        w.tick('outcome')
+        g.removeNodes(sick[died]) # The sick person has probability to die
+        w.tick('removal', removed = int(np.count_nonzero(died)))
+        rest = sick[~recovered & ~died]
+        g.state[rest] += 1
+        g.real[rest] += 1
+        w.tick('progression')
+        w.record()
     
-    def run(self):
-        pycxsimulator.GUI().start( func = [ self.initialize, self.observe, self.update ] )
+    def run(self, worker = False):
+        # the shares of the phases are shown in the status bar when the model has a profiler
+        import pycxsimulator # Tk and matplotlib are loaded only for the GUI
+        status = self.profiler.summary if self.profiler is not None else None
+        pycxsimulator.GUI(worker = worker, statusFunc = status).start( func = [ self.initialize, self.observe, self.update, self.snapshot ] )
 
 
 # Model 3
 # timely isolation - The patients and the people who are in his or her touch history list will be isolated as well.
 class time_isolation:
-    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num):
+    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num, coef = coef, recorder = None, seed = None, profiler = None, replicas = 1):
         self.n = n
         self.density = density
         self.d1 = d1
         self.d2 = d2
         self.crowd_num = crowd_num
+        self.coef = coef
+        self.recorder = recorder
+        self.seed = seed
+        self.profiler = profiler
+        self.replicas = replicas
         
     def initialize(self):
-        global g, daynum, virus
-        daynum = 0
-        virus = ed.virus()
-        
-        g = nx.Graph()
-        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus)
-        g = ed.createEdges(g, daynum, self.density, virus)
+        virus = ed.virus(**self.coef)
+        rng = np.random.default_rng(self.seed) # the same seed gives the same run
+        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus, rng, self.replicas)
+        g = ed.createEdges(g, 0, self.density, virus, rng)
+        self.world = ed.world(g, virus, recorder = self.recorder, rng = rng, profiler = self.profiler)
+        self.layout = ly.layout(crowds = self.crowd_num[1]) # positions kept across days
+        self.renderer = rn.renderer() # artists kept across days
+        self.world.record() # day 0
+    
+    def snapshot(self):
+        return ed.snapshot(self.world)
     
-    def observe(self):
-        global g, daynum, virus    
-        plt.cla()
-        layout = nx.spring_layout(g)
-        nx.draw(g, node_color = [g.nodes[i]['color'] for i in g.nodes], node_size = 20, pos = layout)
-        t = 'persons: ' + str(n) + ', heathy: ' + str(virus.hnum) + ', sick: ' + str(virus.pnum) \
-                + ', recovery: ' + str(virus.rnum) + ', death: ' + str(virus.dnum) + ' - day: ' + str(daynum) 
-        plt.title(t, fontsize = 10, fontfamily = 'Times New Roman')
+    def observe(self, s = None):
+        if s is None: # drawn from the model itself, not from a worker snapshot
+            s = self.snapshot()
+        t = 'persons: ' + str(n) + ', heathy: ' + str(s.hnum) + ', sick: ' + str(s.pnum) \
+                + ', recovery: ' + str(s.rnum) + ', death: ' + str(s.dnum) + ' - day: ' + str(s.daynum) 
+        self.renderer.draw(s, self.layout.positions(s), t)
     
     def update(self):
-        global g, daynum, virus       
-        daynum += 1
+        w = self.world
+        g, virus, rng = w.g, w.virus, w.rng
+        w.daynum += 1
+        daynum = w.daynum
+        w.tick() # a new day for the profiler
         
         # update links
-        g = ed.updateLinks(g, self.density, self.crowd_num)
+        g = ed.updateLinks(g, daynum, self.density, self.crowd_num, virus, rng)
+        w.tick('relink', contacts = len(g.edges))
         
         # update infection
-        g = ed.updateInfected(g, virus)
+        healthy = len(g.susceptible)
+        g = ed.updateInfected(g, virus, rng)
+        w.tick('infection', infections = healthy - len(g.susceptible))
         
         # update isolation and epidemic information
-        g2 = g.copy()
-        for i in g2.nodes:
-            if g.nodes[i]['state'] == 0:
-                if g.nodes[i]['real'] >= 1:
-                    g.nodes[i]['real'] += 1
-                    g.nodes[i]['iso_day'] += 1
-                if rd.random() < virus.explicit_prob(g.nodes[i]['real']):
-                    g.nodes[i]['state'] = 1
-                    g.nodes[i]['color'] = 'r'
-                if g.nodes[i]['real'] == 0 and g.nodes[i]['isolation'] == 1:
-                    g.nodes[i]['iso_day'] += 1
-                    g.nodes[i]['isolation'] = virus.free(g.nodes[i]['iso_day'])
-            if g.nodes[i]['state'] >= 1:
-                g.nodes[i]['isolation'] = 1
-                if g.nodes[i]['state'] == 1:
-                    for key in g.nodes[i]['touch_history']:
-                        touches = set(g.nodes[i]['touch_history'][key])
-                        for p in touches:
-                            if p in g.nodes:
-                                if g.nodes[p]['real'] != 0.5:
-                                    g.nodes[p]['isolation'] = 1
-                                    tmp = daynum % virus.hidden_day - key if daynum % virus.hidden_day > key \
-                                                else virus.hidden_day - key + daynum % virus.hidden_day
-                                    g.nodes[p]['iso_day'] = min(g.nodes[p]['iso_day'], tmp)
-                if rd.random() < virus.recovery_prob(g.nodes[i]['real']):
-                    g.nodes[i]['state'] = 0.5 # The sick person recovered
-                    g.nodes[i]['real'] = 0.5
-                    g.nodes[i]['isolation'] = 0
-                    g.nodes[i]['color'] = 'g'
-                    virus.rnum += 1
-                    virus.pnum -= 1
-                    continue
-                if rd.random() < virus.death_prob(g.nodes[i]['real']):
-                    g.remove_node(i) # The sick person has probability to die  
-                    virus.dnum += 1
-                    virus.pnum -= 1
-                    continue
-                g.nodes[i]['state'] += 1
-                g.nodes[i]['real'] += 1
+        carrier = g.carriers.ids
+        g.real[carrier] += 1
+        g.iso_day[carrier] += 1
+        explicit = carrier[rng.random(len(carrier)) < virus.explicit_prob(g.real[carrier])]
+        g.state[explicit] = 1
+        g.color[explicit] = 'r'
+        isolated = g.isolated.ids
+        isolated = isolated[(g.state[isolated] == 0) & (g.real[isolated] == 0)]
+        g.iso_day[isolated] += 1
+        g.isolation[isolated] = virus.free(g.iso_day[isolated])
+        g.classify(explicit, ed.HEALTH)
+        g.classify(isolated, ['isolated'])
+        
+        w.tick('progression')
+        sick = g.symptomatic.ids
+        g.isolation[sick] = 1
+        contacts, since = g.touch_history.trace(sick[g.state[sick] == 1], daynum, 'min', virus.hidden_day)
+        keep = g.alive[contacts] & (g.real[contacts] != 0.5)
+        contacts, since = contacts[keep], since[keep]
+        g.isolation[contacts] = 1
+        g.iso_day[contacts] = np.minimum(g.iso_day[contacts], since)
+        g.classify(np.concatenate([sick, contacts]), ['isolated'])
+        w.tick('tracing', traced = len(contacts))
+        
+        recovered = rng.random(len(sick)) < virus.recovery_prob(g.real[sick])
+        died = ~recovered & (rng.random(len(sick)) < virus.death_prob(g.real[sick]))
+        rec = sick[recovered]
+        g.state[rec] = 0.5 # The sick person recovered
+        g.real[rec] = 0.5
+        g.isolation[rec] = 0
+        g.color[rec] = 'g'
+        g.classify(rec, ed.HEALTH + ['isolated'])
+        w.tick('outcome')
+        g.removeNodes(sick[died]) # The sick person has probability to die
+        w.tick('removal', removed = int(np.count_nonzero(died)))
+        rest = sick[~recovered & ~died]
+        g.state[rest] += 1
+        g.real[rest] += 1
+        w.tick('progression')
+        w.record()
     
-    def run(self):
-        pycxsimulator.GUI().start(func = [self.initialize, self.observe, self.update])
+    def run(self, worker = False):
+        # worker - step the model on a background thread, the window draws the latest snapshot
+        # the shares of the phases are shown in the status bar when the model has a profiler
+        import pycxsimulator # Tk and matplotlib are loaded only for the GUI
+        status = self.profiler.summary if self.profiler is not None else None
+        pycxsimulator.GUI(worker = worker, statusFunc = status).start(func = [self.initialize, self.observe, self.update, self.snapshot])
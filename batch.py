@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Batch Runner - Monte Carlo replicates without the GUI
+Run any of the five models N times with independent seeds on a process pool, each replicate stops on the
+day that no patients are left ( pnum == 0 ). The final numbers are averaged over the replicates, as the
+numbers quoted in README.md.
+
+Models:
+complete_isolation, partial_isolation, time_isolation - Isolation.py.
+hospital_sequentiality, hospital_severity - HospitalAdmission.py.
+
+Inputs:
+model - name of the model.
+N - the number of replicates.
+seed - root seed, the replicates get independent child SeedSequences spawned from it ( SeedSequence.spawn ),
+       each replicate draws all its random numbers from its own numpy Generator, so a batch is reproducible
+       whatever the number of workers. The children are passed on whole, not cut to 32 bit ints which may
+       repeat in large batches, replicate i is named by its spawn key i.
+workers - the number of worker processes, default is all cores.
+max_days - stop a replicate after this many days even if patients are left.
+engine - 'daily': the models above, 'events': the event-driven engine of events.py ( isolation models only ).
+record - directory for the daily numbers of every replicate, one .npz file <model>-<i>.npz per replicate
+         ( see recorder.py ).
+ensemble - K, the replicates are stepped K at a time as one population of K * n persons ( replicas of the models )
+           instead of one after another, much faster for small n. A replicate is masked out on its day of no
+           patients. The K replicates of an ensemble share the random generator of its seed. Ensembles have no
+           records, event engine or checkpoints.
+params - parameters of the model class, e.g. n, density, d1, d2, crowd_num, v.
+
+Outputs:
+healthy, recovery, death, days - mean and confidence interval over the replicates of the final number of rest
+healthy people, recovery people, dead people and of the number of days to no patients.
+
+Example:
+python batch.py time_isolation -N 100
+python batch.py time_isolation -N 100 --record runs
+python batch.py time_isolation -N 20 --n 1000000 --engine events
+python batch.py time_isolation -N 10000 --ensemble 1000
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import Isolation
+import HospitalAdmission
+import events
+import recorder as rc
+
+MODELS = {'complete_isolation': Isolation, 'partial_isolation': Isolation, 'time_isolation': Isolation,
+          'hospital_sequentiality': HospitalAdmission, 'hospital_severity': HospitalAdmission}
+FIGURES = ['healthy', 'recovery', 'death', 'days']
+
+def replicate(model, seed, max_days = 365, record = None, engine = 'daily', **params):
+    # Outputs:
+    # final numbers of one replicate
+    module = MODELS[model] if engine == 'daily' else events
+    if not hasattr(module, model):
+        raise ValueError('%s has no %s engine' % (model, engine))
+    m = getattr(module, model)(recorder = rc.recorder() if record is not None else None, seed = seed, **params)
+    m.initialize()
+    while m.world.virus.pnum > 0 and m.world.daynum < max_days:
+        m.update()
+    if record is not None:
+        name = label(seed)
+        meta = {'entropy': str(seed.entropy)} if isinstance(seed, np.random.SeedSequence) else {}
+        m.world.recorder.save(os.path.join(record, '%s-%s.npz' % (model, name)), model = model, seed = name, **meta)
+    virus = m.world.virus
+    return {'healthy': virus.hnum, 'recovery': virus.rnum, 'death': virus.dnum, 'days': m.world.daynum}
+
+def ensemble(model, K, seed, max_days = 365, **params):
+    # Outputs:
+    # final numbers of each of K replicates stepped together
+    m = getattr(MODELS[model], model)(seed = seed, replicas = K, **params)
+    m.initialize()
+    g = m.world.g
+    results = [None] * K
+    while True:
+        sick = g.perReplica('carriers') + g.perReplica('symptomatic')
+        done = g.running & ((sick == 0) | (m.world.daynum >= max_days))
+        if done.any():
+            healthy, recovery, death = g.perReplica('susceptible'), g.perReplica('recovered'), g.perReplica('dead')
+            for k in np.flatnonzero(done).tolist():
+                results[k] = {'healthy': int(healthy[k]), 'recovery': int(recovery[k]), 'death': int(death[k]),
+                              'days': m.world.daynum}
+            g.running &= ~done # not relinked any more
+        if not g.running.any():
+            return results
+        m.update()
+
+def _ensemble(args):
+    model, K, seed, max_days, params = args
+    return ensemble(model, K, seed, max_days, **params)
+
+def _replicate(args):
+    model, seed, max_days, record, engine, params = args
+    return replicate(model, seed, max_days, record, engine, **params)
+
+def seeds(N, seed = None):
+    # independent child SeedSequences for N replicates
+    return np.random.SeedSequence(seed).spawn(N)
+
+def label(seed):
+    # name of a replicate in files, the spawn key of a child SeedSequence or an int seed
+    if isinstance(seed, np.random.SeedSequence):
+        return '-'.join(str(k) for k in seed.spawn_key)
+    return str(seed)
+
+def summarize(results, confidence = 0.95):
+    # Outputs:
+    # figure -> ( mean, lower, upper ) with a t confidence interval of the mean
+    from scipy.stats import t # only the parent process summarizes
+    summary = {}
+    for key in FIGURES:
+        x = np.array([r[key] for r in results], dtype = float)
+        mean = x.mean()
+        half = t.ppf((1 + confidence) / 2, len(x) - 1) * x.std(ddof = 1) / np.sqrt(len(x)) if len(x) > 1 else 0.0
+        summary[key] = (mean, mean - half, mean + half)
+    return summary
+
+def runBatch(model, N = 100, seed = None, workers = None, max_days = 365, confidence = 0.95, record = None, engine = 'daily',
+             ensemble = None, **params):
+    # Outputs:
+    # results - final numbers of every replicate
+    # summary - mean and confidence interval of every figure
+    if engine != 'daily' and not hasattr(events, model): # before the pool, not in every worker
+        raise ValueError('%s has no %s engine' % (model, engine))
+    if ensemble is not None:
+        if record is not None or engine != 'daily':
+            raise ValueError('ensembles are stepped by the daily models without records')
+        sizes = [min(ensemble, N - start) for start in range(0, N, ensemble)]
+        jobs = [(model, K, s, max_days, params) for K, s in zip(sizes, seeds(len(sizes), seed))]
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            results = [r for rs in pool.map(_ensemble, jobs) for r in rs]
+        return results, summarize(results, confidence)
+    if record is not None:
+        os.makedirs(record, exist_ok = True)
+    jobs = [(model, s, max_days, record, engine, params) for s in seeds(N, seed)]
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        results = list(pool.map(_replicate, jobs, chunksize = max(1, N // (4 * (workers or 8)))))
+    return results, summarize(results, confidence)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Monte Carlo replicates of the epidemic models without GUI')
+    parser.add_argument('model', choices = sorted(MODELS))
+    parser.add_argument('-N', type = int, default = 100, help = 'number of replicates')
+    parser.add_argument('--seed', type = int, default = None)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--max-days', type = int, default = 365)
+    parser.add_argument('--n', type = int, default = None, help = 'number of persons')
+    parser.add_argument('--record', default = None, help = 'directory for the daily numbers of every replicate')
+    parser.add_argument('--engine', choices = ['daily', 'events'], default = 'daily')
+    parser.add_argument('--ensemble', type = int, default = None, help = 'replicates stepped together in one population')
+    args = parser.parse_args()
+    if args.engine != 'daily' and not hasattr(events, args.model):
+        parser.error('%s has no %s engine' % (args.model, args.engine))
+    params = {} if args.n is None else {'n': args.n}
+    results, summary = runBatch(args.model, args.N, args.seed, args.workers, args.max_days, record = args.record, engine = args.engine,
+                                ensemble = args.ensemble, **params)
+    for key in FIGURES:
+        mean, lower, upper = summary[key]
+        print('%-9s %8.2f  [%.2f, %.2f]' % (key, mean, lower, upper))
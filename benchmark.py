@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark - how the day step scales with the population, without the GUI
+Every population size is measured in a new process, so its peak RSS is its own. The functions of epidemic.py
+are timed alone on a fresh population, each model is initialized and its update() timed day by day. The peak of
+the memory allocated by each of them is measured in an extra run with tracemalloc, so the timings are not slowed
+down by it. The results are written as JSON, and compared with the JSON of another version.
+
+Phases:
+createNodes, createEdges, updateLinks, updateInfected - the functions of epidemic.py.
+update.<model> - one day of each model of batch.MODELS, the hospital has int( n * r ) beds.
+
+Inputs:
+sizes - the population sizes, default 1e3, 1e4, 1e5 and 1e6.
+repeat - timed runs of each function.
+days - timed days of each model, less when the epidemic ends before, runs is the number of days stepped.
+models - the models to time.
+output - JSON file of the results.
+compare - JSON file of an earlier run, the ratios of the medians are printed.
+
+Outputs:
+{'meta': { python, numpy, platform, commit, kernels, ... },
+ 'sizes': { n: { 'rss_peak': bytes, 'phases': { phase: { 'median', 'min', 'runs', 'alloc_peak' } } } } }
+alloc_peak is None when the epidemic ended within the timed days, median and min are None when it ended before.
+
+Example:
+python benchmark.py --sizes 1000 100000 --output before.json
+python benchmark.py --sizes 1000 100000 --output after.json --compare before.json
+"""
+
+import json
+import time
+import platform
+import resource
+import subprocess
+import tracemalloc
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import epidemic as ed
+import batch
+import HospitalAdmission
+import kernels
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+def measure(func, setup = None, repeat = 5, done = None):
+    # Outputs:
+    # the statistics of repeat runs of func, setup runs before each of them and is not timed
+    # done - optional, no more runs once it returns True, runs counts the timed ones
+    times = []
+    for _ in range(repeat):
+        if done is not None and done():
+            break
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    peak = None # not measured when done
+    if done is None or not done():
+        arg = setup() if setup is not None else None
+        tracemalloc.start()
+        func(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if not times:
+        return {'median': None, 'min': None, 'runs': 0, 'alloc_peak': peak}
+    return {'median': float(np.median(times)), 'min': min(times), 'runs': len(times), 'alloc_peak': peak}
+
+def benchFunctions(n, repeat = 5, seed = 0):
+    rng = np.random.default_rng(seed)
+    virus = ed.virus()
+    phases = {}
+    phases['createNodes'] = measure(lambda _: ed.createNodes(n, virus = ed.virus(), rng = rng), repeat = repeat)
+
+    g = ed.createNodes(n, virus = virus, rng = rng)
+    def bare(): # a population without contacts
+        g.clearEdges()
+        return g
+    phases['createEdges'] = measure(lambda g: ed.createEdges(g, 0, virus = virus, rng = rng), bare, repeat)
+    days = iter(range(1, 10 ** 6))
+    phases['updateLinks'] = measure(lambda _: ed.updateLinks(g, next(days), virus = virus, rng = rng),
+                                    repeat = repeat)
+
+    saved = g.real.copy(), g.state.copy(), g.color.copy()
+    def today(): # the same sick persons before every run
+        g.real[:], g.state[:], g.color[:] = saved
+        g.classify()
+        return g
+    phases['updateInfected'] = measure(lambda g: ed.updateInfected(g, virus, rng), today, repeat)
+    return phases
+
+def benchModel(model, n, days = 5, seed = 0):
+    params = {'n': n, 'seed': seed}
+    if batch.MODELS[model] is HospitalAdmission:
+        params['v'] = max(1, int(n * HospitalAdmission.r))
+    m = getattr(batch.MODELS[model], model)(**params)
+    m.initialize()
+    # the days after the end of the epidemic are not stepped, runs is the number of days timed
+    return measure(lambda _: m.update(), repeat = days, done = lambda: m.world.virus.pnum == 0)
+
+def benchSize(n, repeat = 5, days = 5, models = None, seed = 0):
+    phases = benchFunctions(n, repeat, seed)
+    for model in (sorted(batch.MODELS) if models is None else models):
+        phases['update.' + model] = benchModel(model, n, days, seed)
+    return {'rss_peak': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, 'phases': phases}
+
+def meta():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'commit': commit, 'kernels': kernels.ENABLED, 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+def runBenchmark(sizes = SIZES, repeat = 5, days = 5, models = None, seed = 0, output = None):
+    results = {'meta': meta(), 'sizes': {}}
+    for n in sizes:
+        # a new process for each size, the peak RSS of a size does not include the sizes before it
+        with ProcessPoolExecutor(max_workers = 1, mp_context = mp.get_context('spawn')) as pool:
+            results['sizes'][str(n)] = pool.submit(benchSize, n, repeat, days, models, seed).result()
+        report(n, results['sizes'][str(n)])
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent = 1)
+    return results
+
+def report(n, size, base = None):
+    print('n = %d, peak RSS %.1f MB' % (n, size['rss_peak'] / 2 ** 20))
+    for phase, r in size['phases'].items():
+        if r['median'] is None:
+            print('  %-30s %12s' % (phase, 'not stepped'))
+            continue
+        alloc = '%10.1f MB' % (r['alloc_peak'] / 2 ** 20) if r['alloc_peak'] is not None else '%13s' % '-'
+        line = '  %-30s %10.4f s %s %4d runs' % (phase, r['median'], alloc, r['runs'])
+        if base is not None and base['phases'].get(phase, {}).get('median'):
+            line += '  x %.2f' % (r['median'] / base['phases'][phase]['median'])
+        print(line)
+
+def compare(results, base):
+    # the ratios of the medians over the ones of an earlier run, > 1: slower now
+    for n, size in results['sizes'].items():
+        if n in base['sizes']:
+            report(int(n), size, base['sizes'][n])
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Benchmark of the day step of the epidemic models')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = SIZES)
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--days', type = int, default = 5)
+    parser.add_argument('--models', nargs = '+', choices = sorted(batch.MODELS), default = None)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = 'benchmark.json')
+    parser.add_argument('--compare', default = None, help = 'JSON file of an earlier benchmark')
+    args = parser.parse_args()
+    results = runBenchmark(args.sizes, args.repeat, args.days, args.models, args.seed, args.output)
+    if args.compare is not None:
+        print('compared with ' + args.compare)
+        compare(results, json.load(open(args.compare)))
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint - save and restore the whole state of a simulation
+A checkpoint is one uncompressed .npz file of arrays: the columns and contacts of the population, the ring of the
+contact log, the waiting list and beds of the hospital, the virus with its counters, daynum and the state of
+the random generator of the world. Loading builds a new world from it, so a simulation can be
+stopped and resumed, or many "what if" branches can be forked from the same day without simulating the days
+before it again.
+
+Functions:
+save - write the world of a model ( or a world ) to a file.
+load - read a file back as a new world.
+checkModel - raise ValueError for a model that cannot be saved or restored.
+check - branches of one checkpoint with more beds and another virus, they must use them.
+restore - put a loaded world into a model, e.g. after initialize() of a model with other parameters,
+          seed - a new random generator for an independent branch instead of the saved state.
+The persons, their contacts, the patients in hospital and the waiting list, daynum and the random generator come
+from the checkpoint. The number of beds ( v ) and the coefficients of the virus ( coef ) come from the model a
+checkpoint is restored into, so a branch can have another hospital or virus; load takes them as v and coef,
+the saved ones when None. hidden_day must be the saved one, the touch history keeps that many days.
+Only the daily models of one replicate can be saved: the engines of events.py keep their calendar and the days
+of their patients outside the world, and an ensemble ( replicas > 1 ) has its wards and running replicas, save
+and restore raise ValueError for them.
+
+Example:
+m = HospitalAdmission.hospital_severity(n = 100000, v = 5000)
+m.initialize()
+for day in range(20):
+    m.update()
+ck.save(m, 'day20.npz')
+
+branch = HospitalAdmission.hospital_severity(n = 100000, v = 10000) # what if the hospital had twice the beds
+branch.initialize()
+ck.restore(branch, 'day20.npz', seed = 1)
+
+python checkpoint.py
+"""
+
+import json
+import numpy as np
+import epidemic as ed
+import hospital as hs
+
+POPULATION = ['state', 'real', 'loc', 'isolation', 'iso_day', 'hospital', 'hos_order', 'alive', 'color', 'edges']
+COUNTERS = ['hnum', 'pnum', 'rnum', 'dnum']
+
+def checkModel(m):
+    # models whose state is not all in the world cannot be saved or restored
+    import events
+    if isinstance(m, events.engine):
+        raise ValueError('the event engine keeps its calendar outside the world, it has no checkpoints')
+    w = m if isinstance(m, ed.world) else getattr(m, 'world', None)
+    if getattr(m, 'replicas', 1) > 1 or (w is not None and w.g.replicas > 1):
+        raise ValueError('checkpoints are for one replicate, not for ensembles')
+
+def save(m, path):
+    checkModel(m)
+    w = getattr(m, 'world', m)
+    g, virus, h, log = w.g, w.virus, w.hospital, w.g.touch_history
+    arrays = {key: getattr(g, key) for key in POPULATION}
+    arrays.update({key: getattr(virus, key) for key in COUNTERS})
+    arrays['coef'] = np.array([virus.hidden_day, virus.coef_death, virus.coef_infected])
+    arrays['coef_recovery'] = np.asarray(virus.coef_recovery, dtype = float)
+    arrays['daynum'] = w.daynum
+
+    # contact log, the slots one after another
+    arrays['log_day'] = log.day
+    arrays['log_size'] = np.array([len(a) for a in log.src])
+    arrays['log_src'] = np.concatenate(log.src)
+    arrays['log_dst'] = np.concatenate(log.dst)
+
+    if h is not None:
+        arrays['hospital_beds'] = np.array([h.v, h.num])
+        arrays['waiting_heap'] = np.array(h.waiting.heap, dtype = np.int64)
+        arrays['waiting_key'] = np.array(h.waiting.key)
+
+    # random generator, its state holds 128 bit integers
+    arrays['rng'] = np.array(json.dumps(w.rng.bit_generator.state))
+
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+def load(path, seed = None, recorder = None, v = None, coef = None):
+    # Inputs:
+    # v - beds of the hospital, coef - coefficients of the virus ( keyword arguments of epidemic.virus ),
+    #     None: the saved ones
+    # Outputs:
+    # w - a new world in the saved state, with the saved state of the random generator as well
+    with np.load(path) as f:
+        a = {key: f[key] for key in f.files}
+    hidden_day, death, infected = a['coef'].tolist()
+    if coef is None:
+        virus = ed.virus(int(hidden_day), a['coef_recovery'].tolist(), death, infected)
+    else:
+        virus = ed.virus(**coef)
+        if virus.hidden_day != int(hidden_day):
+            raise ValueError('the checkpoint keeps %d days of contacts, hidden_day cannot be %d'
+                             % (hidden_day, virus.hidden_day))
+
+    g = ed.population(len(a['state']), int(hidden_day))
+    for key in POPULATION:
+        setattr(g, key, a[key].copy())
+    g.classify() # the sets and with them the counters of the virus
+    log = g.touch_history
+    log.day = a['log_day'].copy()
+    bounds = np.concatenate([[0], np.cumsum(a['log_size'])])
+    log.src = [a['log_src'][lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+    log.dst = [a['log_dst'][lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    h = None
+    if 'hospital_beds' in a:
+        saved, num = a['hospital_beds'].tolist()
+        h = hs.hospital(int(saved if v is None else v), g.n) # patients above the beds stay until discharged
+        h.num = int(num)
+        h.waiting.restore(a['waiting_heap'].tolist(), a['waiting_key'].tolist())
+
+    if seed is None:
+        state = json.loads(str(a['rng']))
+        rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+        rng.bit_generator.state = state
+    else: # an independent branch
+        rng = np.random.default_rng(seed)
+
+    w = ed.world(g, virus, int(a['daynum']), h, recorder, rng)
+    return w
+
+def restore(m, path, seed = None):
+    # the recorder of the model goes on recording from the restored day, with the beds and virus of the model
+    checkModel(m)
+    w = load(path, seed, m.world.recorder if hasattr(m, 'world') else None, getattr(m, 'v', None),
+             getattr(m, 'coef', None))
+    if hasattr(m, 'v') and w.hospital is None:
+        raise ValueError('%s has no hospital, it cannot be restored into a hospital model' % path)
+    m.world = w
+    m.world.record()
+    return m.world
+
+def check(seed = 0, n = 2000, v = 20):
+    # Outputs:
+    # True when a branch restored into a model with twice the beds has them and admits more patients, and a
+    # branch of another virus has its coefficients
+    import os
+    import tempfile
+    import HospitalAdmission
+    m = HospitalAdmission.hospital_severity(n = n, v = v, seed = seed)
+    m.initialize()
+    for day in range(10):
+        m.update()
+    path = os.path.join(tempfile.mkdtemp(), 'day10.npz')
+    save(m, path)
+    peak = []
+    for beds in (v, 2 * v):
+        branch = HospitalAdmission.hospital_severity(n = n, v = beds, seed = seed)
+        branch.initialize()
+        restore(branch, path, seed = 1)
+        same = branch.world.hospital.v == beds
+        most = branch.world.hospital.num
+        for day in range(10):
+            branch.update()
+            most = max(most, branch.world.hospital.num)
+        peak.append(most)
+    virus = HospitalAdmission.hospital_severity(n = n, v = v, seed = seed, coef = {'death': 41})
+    virus.initialize()
+    restore(virus, path)
+    os.remove(path)
+    return bool(same and peak[1] > peak[0] and virus.world.virus.coef_death == 41)
+
+if __name__ == '__main__':
+    print('branches use their beds and virus:', check())
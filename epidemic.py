@@ -14,6 +14,7 @@ hnum - # of healthy people in network.
 pnum - # of patients.
 rnum - # of recovery persons.
 dnum - # of death persons.
+The counters are the sizes of the sets of the population, taken by world.count() at the end of every day.
 
 Functions:
 recovery_prob - recovery probability of patients follows as normal distribution, e.g., norm( 30, 15 ).pdf( x )*20, x is ill days.
@@ -21,9 +22,82 @@ death_prob - death probability of patients follows as inverse distribution, e.g.
 infect_prob - infection probability of healthy people follows as log distribution, e.g., log10( n+1 ), n is # of sick neighbours.
 explicit_prob - symptoms manifest probability which follows as linear distribution, e.g. x/14 because the incubation of COVID19 ss 14 days.
 free - 0: isolation; 1: no isolation because no symptoms when surpass the incubation period.
+tabulate - precompute the curves as lookup tables, done again whenever a coefficient is assigned.
+All the probabilities take arrays and return arrays, whole ill days / numbers of sick neighbours are read from the tables.
 *: the reason why utilize those distribution and the picture of those distributions are shown in the introduction.pdf.
 
 
+Class - population
+
+The society is kept as NumPy columns indexed by person id rather than as per-node networkx attribute dicts,
+so one day of a large population only touches a handful of arrays.
+
+variable:
+n - # of persons (ids 0 .. n-1, dead persons keep their ids).
+alive - alive mask, dead persons are flipped to False instead of being removed.
+edges - (m, 2) array of today's contacts, each undirected edge stored once.
+replicas - K independent replicates of an ensemble in one population, replica k holds the persons
+          k * size .. ( k + 1 ) * size - 1 and its own crowds, so no contact ever joins two replicas.
+running - the replicas still stepped, the persons of a finished replica are not relinked any more.
+susceptible, carriers, symptomatic, recovered, dead, isolated, hospitalized - indexSet of the persons in each
+          group, kept by classify() whenever the columns of persons change, so a phase of a day only visits its
+          own group instead of testing state / real of everybody.
+
+Functions:
+nodes - ids of alive persons.
+classify - put persons into the sets their columns belong to, after their state / real / isolation / hospital
+          or alive changed, only the given sets, e.g. HEALTH after a change of state / real.
+member - mask of the persons who belong to a set by their columns.
+perReplica - the size of a set in each replica.
+neighbors - contacts of one person in today's network.
+countNeighbors - adjacency times a per-person vector, e.g. the number of sick neighbours of everybody.
+setEdges / clearEdges - replace or drop today's contacts.
+removeNodes - the persons died, flip alive mask, move them to dead and drop their contacts of today.
+compact - drop the dead persons from the touch history, done by removeNodes whenever compaction * n persons
+          died since the last time, so the ring does not keep tracing the dead until their days run out.
+toGraph - build a networkx graph of alive persons for drawing, networkx is imported only then.
+
+Class - indexSet
+
+A set of person ids with O( 1 ) membership: a slot array of the members and the slot of each person. Removed
+members leave holes, added ones are appended, the slots are packed and sorted when the ids are read, so the
+members come in node order like the masks of the columns gave them.
+
+Functions:
+add / remove - persons join or leave the set.
+reset - the set is made of ids only.
+assign - ids join the set where mask, the others leave it.
+ids - the members, sorted.
+
+Class - contactLog
+
+The touch history as a ring of hidden_day slots, one array of contacts per day. Recording a day overwrites
+the slot of the day hidden_day ago, so the memory stays bounded however long the simulation runs.
+
+Functions:
+record - keep the contacts of a day.
+contacts - all contacts of a person within the last k days, read with a binary search in each day.
+trace - contacts of a whole set of persons at once, each contact once with the min / max days since exposure,
+        a compiled loop with numba ( kernels.py ).
+compact - drop the contacts of the dead persons from every day.
+
+Class - world
+
+The whole state of one simulation ( population g, virus with its counters, daynum and the hospital of the
+hospital models ), kept by each model instance, so several simulations can be stepped in one process.
+rng - numpy Generator of the simulation, all the random numbers of the functions below and of the models are
+      drawn from it in batches. Seeded from a SeedSequence ( e.g. a child of SeedSequence.spawn ), a run is
+      reproducible and independent of the other runs of a process pool.
+count - the counters of the virus from the sizes of the sets of the population.
+record - count, and append today to the recorder of the world, if any.
+tick - end of a phase of the day for the profiler of the world, if any.
+
+Class - snapshot
+
+What observe() needs of one day of a world: the alive mask, crowds, colors, today's contacts and the counters.
+The columns are copied, so a worker thread can step the world on while the window draws the snapshot.
+
+
 Dynamical Network:
 d1, d2 - the density of patients, the density of asymptomatic virus carriers.
 crowd_num - the range of the number of crowds/clusters in network.
@@ -34,15 +108,17 @@ Attributions / variables:
 state - explicit state of persons, 0: healthy or sick; 0.5: recovery; >=1, sick.
 real - real state of persons, 0: healthy; 0.5: recovery; >=1: sick ( the larger, the worse ).
 loc - the secondary clusters / crowds in network.
-touch_history - record touch history with hidden days of the node (person).
+touch_history - record touch history with hidden days, a contactLog of the last hidden_day days.
 isolation - whether isolation of the node ( person ).
 iso_day - the number of isolation days.
-hos - whether in hospital or not of the node ( person ).
+hospital - whether in hospital or not of the node ( person ).
 hos_order - the order of accessing in hospital.
 color - the color of nodes, 'b': healthy people; 'r': symptomatical patients; 'y': asymptomatical virus carriers; 'g': recovery people.
 
 Functions:
 createNotes - create nodes and add the attributions to the nodes in the network.
+placeCrowds - the crowd of every person, the crowds of the replicas of an ensemble apart.
+sampleContacts - sample the contact pairs of a day inside every crowd in bulk.
 createEdges - create edges in the networks and record the touch history list for each nodes (persons).
 updataLinks - update links between nodes for each day.
 updateInfected - update infected persons in the network for each day.
@@ -56,141 +132,510 @@ Created on Wed May  6 16:43:26 2020
 @author: Qiyang Ma
 """
 
-import pylab
-import random as rd
-import networkx as nx
-from scipy.stats import norm
-from collections import defaultdict
+import numpy as np
+import kernels
 
 # Creat virus class
 class virus:
-    hnum, pnum, rnum, dnum = 0, 0, 0, 0
     def __init__(self, hidden_day = 14, recovery = [30, 15], death = 51, infected = 9):
+        self.hnum, self.pnum, self.rnum, self.dnum = 0, 0, 0, 0 # counters of this simulation only
         self.hidden_day = hidden_day
         self.coef_recovery = recovery
         self.coef_death = death
         self.coef_infected = infected
+        self.tabulate()
     
-    def recovery_prob(self, x, hos = 0):
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in ('hidden_day', 'coef_recovery', 'coef_death', 'coef_infected') and '_infection' in self.__dict__:
+            self.tabulate() # the coefficients changed
+    
+    def tabulate(self):
+        # lookup tables of the curves over whole ill days / sick neighbours, index 0: not in hospital, 1: in hospital
+        # ill days go beyond the death coefficient only by the hospital bonus, larger days are computed directly
+        days = np.arange(self.coef_death + 7, dtype = float)
+        self._recovery = [self._recovery_curve(days, hos) for hos in (0, 1)]
+        self._death = [self._death_curve(days, hos) for hos in (0, 1)]
+        self._infection = self._infection_curve(np.arange(self.coef_infected + 1, dtype = float))
+    
+    def _recovery_curve(self, x, hos):
         rec = self.coef_recovery
-        if hos:
-            return norm(rec[0], rec[1]).pdf(x) * 30 # recovery probability in hospital
-        else:
-            return norm(rec[0], rec[1]).pdf(x) * 20 # recovery probability conform to normal distribution
+        pdf = np.exp(-0.5 * ((x - rec[0]) / rec[1]) ** 2) / (rec[1] * np.sqrt(2 * np.pi)) # norm( rec[0], rec[1] ).pdf( x )
+        return pdf * (30 if hos else 20) # recovery probability conform to normal distribution, higher in hospital
+    
+    def _death_curve(self, x, hos):
+        death = self.coef_death + 5 if hos else self.coef_death # lower death probability in hospital
+        with np.errstate(divide = 'ignore'):
+            return 1 / (death - np.minimum(x, death)) # death probability conforms to inverse distribution
+    
+    def _infection_curve(self, x):
+        return np.log10(1 + np.minimum(x, self.coef_infected)) # infection probability conforms to log distribution
+    
+    def _lookup(self, table, x, curve):
+        x = np.asarray(x, dtype = float)
+        i = x.astype(np.int64)
+        if np.all((i == x) & (i >= 0) & (i < len(table))):
+            return table[i]
+        return curve(x)
+    
+    def recovery_prob(self, x, hos = 0):
+        return self._lookup(self._recovery[hos], x, lambda x: self._recovery_curve(x, hos))
 
     def death_prob(self, x, hos = 0):
-        death = self.coef_death
-        if hos:
-            death += 5
-            if x > death:
-                x = death
-            return 1 / (death - x) # death probability in hospital 
-        else:
-            if x > death:
-                x = death
-            return 1 / (death - x) # death probability conforms to inverse distribution
+        return self._lookup(self._death[hos], x, lambda x: self._death_curve(x, hos))
 
     def infection_prob(self, x):
-        infected = self.coef_infected
-        if x > infected:
-            x = infected
-        return pylab.log10(1 + x) # infection probability conforms to log distribution
+        # more sick neighbours than coef_infected do not rise the probability, so clip before the lookup
+        return self._lookup(self._infection, np.minimum(x, self.coef_infected), self._infection_curve)
 
     def explicit_prob(self, x):
-        return x / self.hidden_day
+        return np.asarray(x) / self.hidden_day
     
     def free(self, x):
-        if x >= self.hidden_day:
-            return 0
-        else:
-            return 1
+        return np.where(np.asarray(x) >= self.hidden_day, 0, 1)
+
+HEALTH = ['susceptible', 'carriers', 'symptomatic', 'recovered'] # the sets of the population by state / real
+SETS = HEALTH + ['dead', 'isolated', 'hospitalized']
+
+# Creat population class
+class population:
+    def __init__(self, n, hidden_day = 14, compaction = 0.01, replicas = 1):
+        self.n = n
+        self.replicas = replicas
+        self.size = n // replicas # persons of each replica
+        self.running = np.ones(replicas, dtype = bool)
+        self.state = np.zeros(n) # explicit state of persons
+        self.real = np.zeros(n) # real state of persons
+        self.loc = np.zeros(n, dtype = np.int64) # the crowd of persons
+        self.isolation = np.zeros(n, dtype = np.int8) # whether isolation
+        self.iso_day = np.full(n, hidden_day, dtype = np.int64) # the number of isolation days
+        self.hospital = np.zeros(n, dtype = np.int8) # whether in hospital or not
+        self.hos_order = np.zeros(n, dtype = np.int64) # the order of accessing in hospital
+        self.alive = np.ones(n, dtype = bool) # dead persons are masked out instead of removed
+        self.color = np.full(n, 'b', dtype = '<U1')
+        self.touch_history = contactLog(hidden_day) # contacts of the last hidden_day days
+        self.edges = np.empty((0, 2), dtype = np.int64)
+        self._adj = None
+        self.compaction = compaction # rate of the population died before the touch history is compacted
+        self.died = 0 # died since the last compaction
+        for name in SETS:
+            setattr(self, name, indexSet(n))
+        self.susceptible.reset(np.arange(n)) # everybody healthy
+    
+    def __len__(self):
+        return int(np.count_nonzero(self.alive))
+    
+    @property
+    def nodes(self):
+        return np.flatnonzero(self.alive)
+    
+    def classify(self, ids = None, sets = SETS):
+        # Inputs:
+        # ids - persons whose columns changed, None: everybody
+        # sets - the sets the change can move them in or out of
+        if ids is None: # the sets are built again from the masks
+            for name in sets:
+                getattr(self, name).reset(np.flatnonzero(self.member(name, slice(None))))
+            return
+        ids = np.asarray(ids, dtype = np.int64)
+        for name in sets:
+            getattr(self, name).assign(ids, self.member(name, ids))
+    
+    def member(self, name, ids):
+        alive = self.alive[ids]
+        if name == 'dead':
+            return ~alive
+        if name == 'isolated':
+            return alive & (self.isolation[ids] == 1)
+        if name == 'hospitalized':
+            return alive & (self.hospital[ids] == 1)
+        state = self.state[ids]
+        if name == 'symptomatic':
+            return alive & (state >= 1)
+        if name == 'recovered':
+            return alive & (state == 0.5)
+        healthy = alive & (state == 0)
+        if name == 'susceptible':
+            return healthy & (self.real[ids] == 0)
+        return healthy & (self.real[ids] >= 1) # asymptomatic virus carriers
+    
+    def perReplica(self, name):
+        return np.bincount(getattr(self, name).ids // self.size, minlength = self.replicas)
+    
+    def setEdges(self, edges):
+        # store each undirected contact once, self loops are dropped
+        edges = np.asarray(edges, dtype = np.int64).reshape(-1, 2)
+        edges = np.sort(edges[edges[:, 0] != edges[:, 1]], axis = 1)
+        key = np.sort(edges[:, 0] * self.n + edges[:, 1])
+        key = key[np.concatenate([key[:1] == key[:1], key[1:] != key[:-1]])]
+        self.edges = np.stack([key // self.n, key % self.n], axis = 1)
+        self._adj = None
+    
+    def clearEdges(self):
+        self.setEdges(np.empty((0, 2), dtype = np.int64))
+    
+    def adjacency(self):
+        # CSR form ( indptr, indices ) of today's contacts, rebuilt only when the edges change
+        if self._adj is None:
+            src = np.concatenate([self.edges[:, 0], self.edges[:, 1]])
+            dst = np.concatenate([self.edges[:, 1], self.edges[:, 0]])
+            order = np.argsort(src, kind = 'stable')
+            indptr = np.zeros(self.n + 1, dtype = np.int64)
+            np.cumsum(np.bincount(src, minlength = self.n), out = indptr[1:])
+            self._adj = (indptr, dst[order])
+        return self._adj
+    
+    def neighbors(self, i):
+        indptr, indices = self.adjacency()
+        return indices[indptr[i]:indptr[i + 1]]
+    
+    def countNeighbors(self, x):
+        # adjacency * x, e.g. the number of sick neighbours of every person when x is the sick indicator
+        indptr, indices = self.adjacency()
+        rows = np.repeat(np.arange(self.n), np.diff(indptr))
+        return np.bincount(rows, weights = np.asarray(x, dtype = float)[indices], minlength = self.n)
+    
+    def removeEdges(self, mask):
+        self.edges = self.edges[~mask]
+        self._adj = None
+    
+    def removeNodes(self, ids):
+        # the persons died, they keep their ids but leave the network
+        ids = np.atleast_1d(ids)
+        if len(ids) == 0:
+            return
+        self.alive[ids] = False
+        self.classify(ids) # out of every set, into dead
+        self.removeEdges(~(self.alive[self.edges[:, 0]] & self.alive[self.edges[:, 1]]))
+        self.died += len(ids)
+        if self.died >= max(1, self.compaction * self.n):
+            self.compact()
+    
+    def compact(self):
+        self.touch_history.compact(self.alive)
+        self.died = 0
+    
+    def toGraph(self):
+        import networkx as nx # only for drawing
+        g = nx.Graph()
+        g.add_nodes_from(self.nodes)
+        g.add_edges_from(self.edges.tolist())
+        return g
+
+# Creat index set class, the persons of one group
+class indexSet:
+    def __init__(self, n):
+        dtype = np.int32 if n < 2 ** 31 else np.int64
+        self.items = np.empty(n, dtype = dtype) # members, with holes of the removed ones up to end
+        self.slot = np.full(n, -1, dtype = dtype) # slot of each person in items, -1: not a member
+        self.end = 0
+        self.size = 0
+        self.ordered = True # items up to end in node order
+    
+    def __len__(self):
+        return self.size
+    
+    def __contains__(self, i):
+        return self.slot[i] >= 0
+    
+    def _first(self, ids):
+        # ids once each, the last write of the marks of a person wins
+        self.slot[ids] = -2 - np.arange(len(ids))
+        return ids[self.slot[ids] == -2 - np.arange(len(ids))]
+    
+    def add(self, ids):
+        ids = ids[self.slot[ids] < 0]
+        if len(ids) == 0:
+            return
+        ids = self._first(ids)
+        k = len(ids)
+        if self.end + k > len(self.items):
+            self.pack()
+        if (self.end and ids[0] <= self.items[self.end - 1]) or np.any(ids[1:] <= ids[:-1]):
+            self.ordered = False
+        self.items[self.end:self.end + k] = ids
+        self.slot[ids] = np.arange(self.end, self.end + k)
+        self.end += k
+        self.size += k
+    
+    def remove(self, ids):
+        ids = ids[self.slot[ids] >= 0]
+        if len(ids) == 0:
+            return
+        ids = self._first(ids)
+        self.slot[ids] = -1 # the slot is a hole until the next pack
+        self.size -= len(ids)
+    
+    def reset(self, ids):
+        # ids - the members, sorted
+        self.slot[self.items[:self.end]] = -1
+        self.items[:len(ids)] = ids
+        self.slot[ids] = np.arange(len(ids))
+        self.end = self.size = len(ids)
+        self.ordered = True
+    
+    def assign(self, ids, mask):
+        self.add(ids[mask])
+        self.remove(ids[~mask])
+    
+    def pack(self):
+        items = self.items[:self.end]
+        items = items[self.slot[items] == np.arange(self.end)]
+        if not self.ordered:
+            items = np.sort(items)
+        self.items[:self.size] = items
+        self.slot[items] = np.arange(self.size)
+        self.end = self.size
+        self.ordered = True
+    
+    @property
+    def ids(self):
+        if self.end != self.size or not self.ordered:
+            self.pack()
+        return self.items[:self.size].astype(np.int64)
+
+# Creat contact log class, a ring of the contacts of the last days
+class contactLog:
+    def __init__(self, days = 14):
+        self.days = days
+        self.day = np.full(days, -1, dtype = np.int64) # the day kept in each slot, -1: empty
+        self.src = [np.empty(0, dtype = np.int64)] * days # both directions of the contacts of a slot, sorted by src
+        self.dst = [np.empty(0, dtype = np.int64)] * days
+    
+    def record(self, daynum, pairs):
+        # the slot of the day is simply overwritten, the day hidden_day ago is dropped with it
+        slot = daynum % self.days
+        src = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        dst = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        if self.day[slot] == daynum:
+            src = np.concatenate([self.src[slot], src])
+            dst = np.concatenate([self.dst[slot], dst])
+        order = np.argsort(src, kind = 'stable')
+        self.src[slot], self.dst[slot] = src[order], dst[order]
+        self.day[slot] = daynum
+    
+    def contacts(self, i, k = None):
+        # Outputs:
+        # contacts - persons touched by i within the last k days ( all kept days by default )
+        # days - the day of each contact
+        k = self.days if k is None else k
+        latest = self.day.max()
+        contacts, days = [], []
+        for slot in np.flatnonzero((self.day >= 0) & (self.day > latest - k)):
+            lo, hi = np.searchsorted(self.src[slot], [i, i + 1])
+            contacts.append(self.dst[slot][lo:hi])
+            days.append(np.full(hi - lo, self.day[slot]))
+        if not contacts:
+            return np.empty(0, dtype = np.int64), np.empty(0, dtype = np.int64)
+        return np.concatenate(contacts), np.concatenate(days)
+    
+    def trace(self, people, daynum, reduce = 'min', today = 0):
+        # Inputs:
+        # people - persons to trace, e.g. the newly symptomatic persons of the day
+        # daynum - number of days, today
+        # reduce - 'min' or 'max' of the days since exposure when a person was touched more than once
+        # today - days since exposure given to the contacts of today, the models count them as a whole ring
+        #         ( hidden_day ) ago like the day slot offsets of the touch history always did
+        # Outputs:
+        # contacts - persons touched by any of people within the kept days, each one only once
+        # since - days since the exposure of each contact
+        if kernels.ENABLED: # compiled, see kernels.py
+            return kernels.trace(self, people, daynum, reduce, today)
+        people = np.unique(np.asarray(people, dtype = np.int64))
+        contacts, days = [], []
+        for slot in np.flatnonzero(self.day >= 0):
+            lo = np.searchsorted(self.src[slot], people, 'left')
+            hi = np.searchsorted(self.src[slot], people, 'right')
+            length = hi - lo
+            total = length.sum()
+            # positions of all the ranges [ lo, hi ) in one array
+            idx = np.arange(total) + np.repeat(lo - (np.cumsum(length) - length), length)
+            contacts.append(self.dst[slot][idx])
+            days.append(np.full(total, self.day[slot]))
+        if not contacts:
+            return np.empty(0, dtype = np.int64), np.empty(0, dtype = np.int64)
+        contacts = np.concatenate(contacts)
+        since = daynum - np.concatenate(days)
+        since[since == 0] = today
+        order = np.lexsort((since if reduce == 'min' else -since, contacts))
+        contacts, since = contacts[order], since[order]
+        first = np.concatenate([contacts[:1] == contacts[:1], contacts[1:] != contacts[:-1]])
+        return contacts[first], since[first]
+    
+    def compact(self, alive):
+        # the masks keep the order by src of every slot
+        for slot in range(self.days):
+            keep = alive[self.src[slot]] & alive[self.dst[slot]]
+            if not keep.all():
+                self.src[slot], self.dst[slot] = self.src[slot][keep], self.dst[slot][keep]
+    
+    def nbytes(self):
+        return sum(a.nbytes for a in self.src) + sum(a.nbytes for a in self.dst)
+
+_virus = virus # the parameters below are named virus as well
+
+# Creat world class, the whole state of one simulation
+class world:
+    def __init__(self, g, virus, daynum = 0, hospital = None, recorder = None, rng = None, profiler = None):
+        self.g = g # population
+        self.virus = virus # virus with the epidemic counters
+        self.daynum = daynum # number of days
+        self.hospital = hospital # beds and waiting list of the hospital models
+        self.recorder = recorder # daily numbers, see recorder.py
+        self.rng = np.random.default_rng() if rng is None else rng # the only random numbers of this simulation
+        self.profiler = profiler # time of the phases of a day, see profiler.py
+        if recorder is not None:
+            recorder.clear() # a new run
+        if profiler is not None:
+            profiler.reset()
+        self.count()
+    
+    def count(self):
+        g = self.g
+        self.virus.hnum = len(g.susceptible)
+        self.virus.pnum = len(g.carriers) + len(g.symptomatic)
+        self.virus.rnum = len(g.recovered)
+        self.virus.dnum = len(g.dead)
+    
+    def record(self):
+        self.count()
+        if self.recorder is not None:
+            self.recorder.record(self)
+    
+    def tick(self, phase = None, **counts):
+        # end of a phase of update(), nothing is done without a profiler
+        if self.profiler is not None:
+            self.profiler.tick(phase, counts)
+
+# Creat snapshot class, a copy of one day of a world for drawing
+class snapshot:
+    def __init__(self, w):
+        g, virus = w.g, w.virus
+        self.n = g.n
+        self.alive = g.alive.copy()
+        self.loc = g.loc.copy()
+        self.color = g.color.copy()
+        self.edges = g.edges # never changed in place, replaced by setEdges / removeEdges
+        self.daynum = w.daynum
+        self.hnum, self.pnum, self.rnum, self.dnum = virus.hnum, virus.pnum, virus.rnum, virus.dnum
+    
+    nodes = population.nodes
+    toGraph = population.toGraph
 
 # Functions    
 # create the network including nodes and edges to make up different groups in network/society
-def createNodes(n, d1 = 0.1, d2 = 0.1, crowd_num = [ 10, 20 ], virus = virus()):
+def createNodes(n, d1 = 0.1, d2 = 0.1, crowd_num = [ 10, 20 ], virus = None, rng = None, replicas = 1):
     # Inputs:
     # n - # of nodes in network, means population in a society
     # d1, d2 - the density of patients, the density of asymptomatic virus carriers
     # crowd_num - the range of the number of crowds/clusters in network
+    # rng - numpy Generator of the simulation, see world
+    # replicas - K replicates of n persons each in one population, see population
     # Outputs:
-    # g - network
-    g = nx.Graph()
-    numOfplace = pylab.choice(list(range(crowd_num[0], crowd_num[1])))    
+    # g - population
+    virus = _virus() if virus is None else virus
+    rng = np.random.default_rng() if rng is None else rng
+    g = population(n * replicas, virus.hidden_day, replicas = replicas)
+    numOfplace = rng.integers(crowd_num[0], crowd_num[1], size = None if replicas == 1 else replicas)
     # create nodes (persons) and set their states in the network
-    for i in range(n):
-        g.add_node(i)
-        g.nodes[i]['state'] = 1 if rd.random() < d1 else 0  # explicit state of persons
-        g.nodes[i]['loc'] = pylab.choice(numOfplace)
-        g.nodes[i]['touch_history'] = defaultdict(list) # record touch history of the node (person)
-        g.nodes[i]['isolation'] = 0 # whether isolation
-        g.nodes[i]['iso_day'] = virus.hidden_day # the number of isolation days
-        g.nodes[i]['hospital'] = 0  # whether in hospital or not
-        g.nodes[i]['hos_order'] = 0 # the order of accessing in hospital
-        if g.nodes[i]['state'] == 0 and rd.random() < d2:
-            g.nodes[i]['real'] = 1  # real state of persons
-        elif g.nodes[i]['state'] == 1:
-            g.nodes[i]['real'] = 1
-        else:
-            g.nodes[i]['real'] = 0
-        if g.nodes[i]['state'] == 0 and g.nodes[i]['real'] == 1:
-            g.nodes[i]['color'] = 'y'
-            virus.pnum += 1
-        elif g.nodes[i]['state'] == 1 and g.nodes[i]['real'] == 1:
-            g.nodes[i]['color'] = 'r'
-            virus.pnum += 1
-        else:
-            g.nodes[i]['color'] = 'b'
-            virus.hnum += 1
+    g.state[:] = rng.random(g.n) < d1 # explicit state of persons
+    g.loc[:] = placeCrowds(g, numOfplace, crowd_num, rng)
+    carrier = (g.state == 0) & (rng.random(g.n) < d2)
+    g.real[(g.state == 1) | carrier] = 1 # real state of persons
+    g.color[carrier] = 'y'
+    g.color[g.state == 1] = 'r'
+    g.classify()
     return g
 
-def createEdges(g, daynum, density = 2, virus = virus()): 
+def placeCrowds(g, numOfplace, crowd_num, rng):
+    # Inputs:
+    # numOfplace - the number of crowds, of each replica for an ensemble
+    # Outputs:
+    # loc - the crowd of every person, the crowds of replica k are counted from k * crowd_num[ 1 ]
+    if g.replicas == 1:
+        return rng.integers(numOfplace, size = g.n)
+    replica = np.arange(g.n) // g.size
+    return replica * crowd_num[1] + rng.integers(numOfplace[replica])
+
+def sampleContacts(ids, loc, density = 2, rng = None):
+    # Inputs:
+    # ids - the persons who go out today
+    # loc - the crowd of each of them
+    # density - the edge density in the secondary clusters / crowds
+    # Outputs:
+    # pairs - ( m, 2 ) array, len( crowd ) * density random pairs of two different persons in every crowd
+    rng = np.random.default_rng() if rng is None else rng
+    ids, loc = np.asarray(ids, dtype = np.int64), np.asarray(loc, dtype = np.int64)
+    order = np.argsort(loc, kind = 'stable')
+    ids = ids[order]
+    size = np.bincount(loc)
+    start = np.cumsum(size) - size
+    crowds = np.flatnonzero(size > 1)
+    crowd = np.repeat(crowds, size[crowds] * density) # the crowd of each pair
+    s = size[crowd]
+    a = (rng.random(len(crowd)) * s).astype(np.int64)
+    b = (rng.random(len(crowd)) * (s - 1)).astype(np.int64)
+    b += b >= a # b is drawn among the other s - 1 persons
+    return np.stack([ids[start[crowd] + a], ids[start[crowd] + b]], axis = 1)
+
+def createEdges(g, daynum, density = 2, virus = None, rng = None): 
     # Inputs:
     # g - network without edges
     # daynum - number of days
     # density - the edge density in the secondary clusters / crowds, the larger, the denser
     # Outputs:
     # g - network with new edges, and record touch nodes in this day
-    placeDic = defaultdict(list)
-    for i in g.nodes:
-        if not g.nodes[i]['isolation']:
-            place = g.nodes[i]['loc']
-            placeDic[place].append(i)
-    
-    for key in placeDic:
-        if len(placeDic[key]) > 1:
-            for i in range(len(placeDic[key]) * density):
-                a, b = pylab.choice(placeDic[key], 2, replace = False)
-                g.nodes[a]['touch_history'][daynum % virus.hidden_day].append(b)
-                g.nodes[b]['touch_history'][daynum % virus.hidden_day].append(a)
-                g.add_edge(a, b)
+    # virus - not needed any more, the touch history of g keeps hidden_day days itself
+    nodes = g.nodes
+    free = nodes[g.isolation[nodes] == 0]
+    if g.replicas > 1: # the finished replicas of an ensemble stay apart
+        free = free[g.running[free // g.size]]
+    pairs = sampleContacts(free, g.loc[free], density, rng)
+    g.touch_history.record(daynum, pairs)
+    g.setEdges(np.concatenate([g.edges, pairs]))
     return g
 
 # update links (edges) to new groups and update the infection people
-def updateLinks(g, density = 2, crowd_num = [10, 20]):
+def updateLinks(g, daynum, density = 2, crowd_num = [10, 20], virus = None, rng = None):
     # Outputs:
     # network with new edges
-    edges = list(g.edges())
-    g.remove_edges_from(edges)
-    numOfplace = pylab.choice(list(range(crowd_num[0], crowd_num[1])))
-    for i in g.nodes:
-        g.nodes[i]['loc'] = pylab.choice(numOfplace)
-    g = createEdges(g, density)
+    virus = _virus() if virus is None else virus
+    rng = np.random.default_rng() if rng is None else rng
+    g.clearEdges()
+    numOfplace = rng.integers(crowd_num[0], crowd_num[1], size = None if g.replicas == 1 else g.replicas)
+    g.loc[:] = placeCrowds(g, numOfplace, crowd_num, rng)
+    g = createEdges(g, daynum, density, virus, rng)
     return g
 
-def updateInfected(g, virus = virus()):
+def updateInfected(g, virus = None, rng = None):
     # Outputs:
     # network with new infected people
-    for i in g.nodes:
-        if g.nodes[i]['real'] == 0:
-            numOfsick = sum([1 for j in list(g.neighbors(i)) if g.nodes[j]['real'] >= 1])
-            if rd.random() < virus.infection_prob(numOfsick):
-                g.nodes[i]['real'] = 1
-                virus.pnum += 1
-                virus.hnum -= 1
-                if rd.random() < virus.explicit_prob(g.nodes[i]['real']):
-                    g.nodes[i]['state'] = 1
-                    g.nodes[i]['color'] = 'r'
-                else:
-                    g.nodes[i]['state'] = 0
-                    g.nodes[i]['color'] = 'y'
+    # The persons are visited in node order, so a person infected earlier in the sweep is already a sick
+    # neighbour of the later ones. With the random numbers of the sweep drawn up front, its result is the
+    # fixed point of the batched step below: start from nobody infected, count the sick neighbours ( sick
+    # ones of yesterday plus today's infected with a smaller id ) and redo the trials until nothing changes.
+    virus = _virus() if virus is None else virus
+    rng = np.random.default_rng() if rng is None else rng
+    healthy = np.zeros(g.n, dtype = bool)
+    healthy[g.susceptible.ids] = True
+    draw = np.ones(g.n)
+    draw[healthy] = rng.random(np.count_nonzero(healthy))
+    numOfsick = g.countNeighbors(g.real >= 1)
+    a, b = g.edges[:, 0], g.edges[:, 1]
+    earlier = healthy[a] & healthy[b] # edges a < b, a is visited before b
+    a, b = a[earlier], b[earlier]
+    infected = np.zeros(g.n, dtype = bool)
+    while True:
+        count = numOfsick + np.bincount(b, weights = infected[a], minlength = g.n)
+        new = healthy & (draw < virus.infection_prob(count))
+        if np.array_equal(new, infected):
+            break
+        infected = new
+    
+    infected = np.flatnonzero(infected)
+    g.real[infected] = 1
+    explicit = rng.random(len(infected)) < virus.explicit_prob(g.real[infected])
+    g.state[infected] = explicit
+    g.color[infected] = np.where(explicit, 'r', 'y')
+    g.classify(infected, HEALTH)
     return g
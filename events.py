@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+Events - event-driven engine of the isolation models
+The models of Isolation.py visit every person every day. Here only the active persons are touched: the infected
+ones and the contacts of infectious persons. Symptom onset, recovery / death and the release of isolated persons
+are events of a calendar, their days are drawn at once from the curves of the virus ( the daily probabilities of
+the day by day models become the waiting time of the first success, next reaction method on a daily clock ). The
+cost of a day is in the number of active persons, not in n, mostly in the long tail of an epidemic.
+
+The order of the day and the curves are the ones of Isolation.py, the contacts are the approximation:
+- every free infectious person has Poisson( density ) contacts started by themselves with any free person, and
+  Poisson( density ) started by the free persons not infected, partners are drawn uniformly among them. The
+  crowds of a day are not kept, only the number of crowds is drawn from crowd_num: in a crowd of s persons
+  the s * density pairs repeat some contacts, the means are lowered by the expected rate of distinct ones.
+- the persons infected in the day are infectious for the persons after them in node order the same day, as in
+  epidemic.updateInfected, their contacts of the day are drawn for it.
+- only the contacts with infected persons are kept in the touch history. The contacts of a person of the days
+  before being infected are drawn when they are traced ( time isolation ), once at symptom onset.
+- partial isolation isolates the sick of the day before the progression, as Isolation.py does: a carrier with
+  symptoms stays free for one more day, then is isolated and has the first recovery / death trial.
+
+Checked against Isolation.py, mean final numbers ( healthy, recovery, death, days ) of independent seeds, the
+ones of Isolation.py / of the engine:
+complete_isolation, n = 300, 6000 seeds - death 6.37 / 6.43, days 16.74 / 16.78, healthy the same ( no contacts ).
+partial_isolation, n = 300, 1000 seeds - 1.59 / 1.93, 268.8 / 268.5, 29.6 / 29.6, 23.9 / 23.8; the leftover
+healthy is 0.3 persons higher in these small crowds. n = 1000, 400 seeds - 3.38 / 3.45, 898.0 / 897.8, 98.6 / 98.8,
+25.6 / 25.6. n = 200000, seeds 0 - 3 - 554 / 537 healthy.
+time_isolation, n = 300, 200 seeds - 163.9 / 162.6, 122.3 / 123.8, 13.8 / 13.6, 19.6 / 19.6.
+
+Models:
+complete_isolation, partial_isolation, time_isolation - the strategies of Isolation.py, the same inputs.
+
+Class - calendar
+
+Functions:
+schedule - the events of a kind for persons on their days.
+pop - the persons of an event kind due today.
+"""
+
+import numpy as np
+import epidemic as ed
+import layout as ly
+import renderer as rn
+from Isolation import n, density, d1, d2, crowd_num, coef
+
+# Creat calendar class
+class calendar:
+    def __init__(self):
+        self.days = {} # day -> kind -> arrays of persons
+
+    def __len__(self):
+        return sum(len(ids) for kinds in self.days.values() for groups in kinds.values() for ids in groups)
+
+    def schedule(self, kind, days, ids):
+        days, ids = np.asarray(days, dtype = np.int64), np.asarray(ids, dtype = np.int64)
+        if len(ids) == 0:
+            return
+        order = np.argsort(days, kind = 'stable')
+        days, ids = days[order], ids[order]
+        cut = np.flatnonzero(np.diff(days)) + 1
+        for day, group in zip(days[np.concatenate([[0], cut])].tolist(), np.split(ids, cut)):
+            self.days.setdefault(day, {}).setdefault(kind, []).append(group)
+
+    def pop(self, day, kind):
+        kinds = self.days.get(day, {})
+        groups = kinds.pop(kind, [])
+        if day in self.days and not kinds:
+            del self.days[day]
+        return np.concatenate(groups) if groups else np.empty(0, dtype = np.int64)
+
+def waiting(rng, start, hazard):
+    # Inputs:
+    # start - the ill days of the first trial of each person
+    # hazard - daily probability of the event over ill days, the last one is taken as 1
+    # Outputs:
+    # k - days until the first success, 0: on the day of the first trial
+    with np.errstate(divide = 'ignore'):
+        H = -np.log1p(-np.minimum(hazard, 1))
+    H[-1] = np.inf
+    C = np.concatenate([[0], np.cumsum(H)])
+    start = np.minimum(start, len(hazard) - 1)
+    target = C[start] + rng.exponential(size = len(start))
+    return np.searchsorted(C, target, 'left') - 1 - start
+
+def unique(pairs, n):
+    # each contact once, the first person of the pair is kept first
+    key = np.minimum(pairs[:, 0], pairs[:, 1]) * n + np.maximum(pairs[:, 0], pairs[:, 1])
+    return pairs[np.sort(np.unique(key, return_index = True)[1])]
+
+# Creat event engine class
+class engine:
+    strategy = 'time'
+
+    def __init__(self, n = n, density = density, d1 = d1, d2 = d2, crowd_num = crowd_num, coef = coef, recorder = None, seed = None, profiler = None):
+        self.n = n
+        self.density = density
+        self.d1 = d1
+        self.d2 = d2
+        self.crowd_num = crowd_num
+        self.coef = coef
+        self.recorder = recorder
+        self.seed = seed
+        self.profiler = profiler
+
+    def initialize(self):
+        virus = ed.virus(**self.coef)
+        rng = np.random.default_rng(self.seed) # the same seed gives the same run
+        g = ed.createNodes(self.n, self.d1, self.d2, self.crowd_num, virus, rng)
+        self.world = ed.world(g, virus, recorder = self.recorder, rng = rng, profiler = self.profiler)
+        self.layout = ly.layout(crowds = self.crowd_num[1]) # positions kept across days
+        self.renderer = rn.renderer() # artists kept across days
+
+        # curves of the virus over ill days
+        x = np.arange(virus.coef_death + 1)
+        r, d = virus.recovery_prob(x), np.minimum(virus.death_prob(x), 1)
+        self.outcome = 1 - (1 - r) * (1 - d) # recovery or death
+        self.recovered = np.divide(r, self.outcome, out = np.zeros_like(r), where = self.outcome > 0)
+        self.onset = virus.explicit_prob(np.arange(virus.hidden_day + 1))
+
+        self.calendar = calendar()
+        self.infected = np.flatnonzero(g.real >= 1) # infected persons not recovered or dead
+        self.day0 = np.ones(g.n, dtype = np.int64) # day of infection, the initial ones infected on day 1
+        self.known = np.zeros(g.n, dtype = np.int64) # first day with all the contacts in the touch history
+        self.onset_day = np.full(g.n, -1, dtype = np.int64)
+        self.onset_x = np.zeros(g.n, dtype = np.int64) # ill days at symptom onset
+        self.trial_day = np.full(g.n, -1, dtype = np.int64) # day of isolation and of the first recovery / death trial
+        self.release = np.zeros(g.n, dtype = np.int64)
+        self.count = np.zeros(g.n, dtype = np.int64) # sick contacts of the day
+        self.draw = np.ones(g.n)
+
+        sick = self.infected[g.state[self.infected] >= 1]
+        carrier = self.infected[g.state[self.infected] == 0]
+        if self.strategy == 'complete': # everybody isolated, the infected ones get sick on day 1
+            self.schedule(self.infected, 1, 2)
+        else:
+            self.schedule(sick, 1, 1)
+            k = waiting(rng, np.full(len(carrier), 2), self.onset)
+            self.schedule(carrier, 1 + k, 2 + k)
+            self.mean = self.density * self.distinct(rng)
+            pairs = unique(self.contacts(self.infected, 2 * self.mean, self.anyone), g.n)
+            g.touch_history.record(0, pairs)
+            g.setEdges(pairs)
+        self.world.record() # day 0
+
+    def schedule(self, ids, day, x):
+        # symptom onset of ids on day with x ill days
+        # partial isolation isolates the sick of the day before their trials, a carrier getting symptoms ( x > 1 )
+        # is isolated and has the first trial the day after, as in Isolation.py
+        day = np.broadcast_to(day, ids.shape)
+        x = np.broadcast_to(x, ids.shape)
+        self.onset_day[ids] = day
+        self.onset_x[ids] = x
+        self.trial_day[ids] = day + ((x > 1) if self.strategy == 'partial' else 0)
+        self.calendar.schedule('onset', day, ids)
+
+    @property
+    def free(self):
+        # not isolated and alive
+        g = self.world.g
+        return g.n - len(g.dead) - len(g.isolated)
+
+    # pools of contacts
+    def anyone(self, ids):
+        g = self.world.g
+        return g.alive[ids] & (g.isolation[ids] == 0)
+
+    def uninfected(self, ids):
+        g = self.world.g
+        return g.alive[ids] & (g.isolation[ids] == 0) & (g.real[ids] < 1)
+
+    def alive(self, ids):
+        return self.world.g.alive[ids]
+
+    def contacts(self, ids, mean, pool, size = None, index = False):
+        # Inputs:
+        # pool - mask function of the persons who can be met, size - the number of them
+        # Outputs:
+        # pairs - Poisson( mean ) contacts of each of ids with partners drawn uniformly from pool except themselves
+        # rows - the index in ids of each pair ( index = True )
+        g, rng = self.world.g, self.world.rng
+        size = self.free if size is None else size
+        if size <= 1 or len(ids) == 0:
+            pairs, rows = np.empty((0, 2), dtype = np.int64), np.empty(0, dtype = np.int64)
+            return (pairs, rows) if index else pairs
+        rows = np.repeat(np.arange(len(ids)), rng.poisson(mean, len(ids)))
+        src = ids[rows]
+        dst = rng.integers(g.n, size = len(src))
+        bad = np.flatnonzero(~pool(dst) | (dst == src))
+        while len(bad):
+            dst[bad] = rng.integers(g.n, size = len(bad))
+            bad = bad[~pool(dst[bad]) | (dst[bad] == src[bad])]
+        pairs = np.stack([src, dst], axis = 1)
+        return (pairs, rows) if index else pairs
+
+    def infect(self, pairs, later = False):
+        # count the new sick contacts of the healthy partners and do their trials of the day
+        g = self.world.g
+        src, dst = pairs[:, 0], pairs[:, 1]
+        keep = g.real[dst] == 0
+        if later: # infected today, only the persons after them in node order
+            keep &= dst > src
+        dst = dst[keep]
+        new = dst[self.count[dst] == 0]
+        self.draw[new] = self.world.rng.random(len(new))
+        np.add.at(self.count, dst, 1)
+        dst = np.unique(dst)
+        return dst[self.draw[dst] < self.world.virus.infection_prob(self.count[dst])]
+
+    def distinct(self, rng):
+        # expected rate of distinct contacts among the s * density pairs of a crowd of s persons
+        s = self.free / rng.integers(self.crowd_num[0], self.crowd_num[1])
+        if s <= 2:
+            return 1.0
+        rate = 2 * self.density / (s - 1) # pairs of the crowd over possible pairs
+        return (1 - np.exp(-rate)) / rate
+
+    def spread(self, daynum):
+        w = self.world
+        g, virus, rng = w.g, w.virus, w.rng
+        sick = self.infected[g.isolation[self.infected] == 0]
+        rest = self.free - len(sick) # free persons not infected
+        self.mean = mean = self.density * self.distinct(rng)
+        first = unique(np.concatenate([self.contacts(sick, mean, self.anyone),
+                                       self.contacts(sick, mean * rest / max(self.free, 1), self.uninfected, rest)]), g.n)
+        pairs = [first]
+        w.tick('relink', contacts = len(first))
+
+        touched = [first[:, 1]]
+        new = self.infect(first)
+        infected = [new]
+        while len(new):
+            g.real[new] = 1 # infectious for the persons after them
+            rest -= len(new)
+            later = unique(self.contacts(np.sort(new), 2 * mean * rest / max(self.free, 1), self.uninfected, rest), g.n)
+            pairs.append(later)
+            touched.append(later[:, 1])
+            new = self.infect(later, later = True)
+            infected.append(new)
+        self.count[np.concatenate(touched)] = 0
+        pairs = np.concatenate(pairs)
+        g.touch_history.record(daynum, pairs)
+        g.setEdges(pairs)
+
+        new = np.concatenate(infected)
+        g.real[new] = 1
+        explicit = rng.random(len(new)) < virus.explicit_prob(1)
+        g.state[new] = explicit
+        g.color[new] = np.where(explicit, 'r', 'y')
+        g.classify(new, ed.HEALTH)
+        self.day0[new] = daynum
+        self.known[new] = daynum
+        carrier = new[~explicit]
+        self.schedule(new[explicit], daynum, 1)
+        k = waiting(rng, np.full(len(carrier), 2), self.onset)
+        self.schedule(carrier, daynum + k, 2 + k)
+        self.infected = np.concatenate([self.infected, new])
+        w.tick('infection', infections = len(new))
+
+    def isolate(self, ids):
+        g = self.world.g
+        ids = ids[g.isolation[ids] == 0]
+        g.isolation[ids] = 1
+        g.classify(ids, ['isolated'])
+
+    def unisolate(self, ids):
+        g = self.world.g
+        ids = ids[g.isolation[ids] == 1]
+        g.isolation[ids] = 0
+        g.classify(ids, ['isolated'])
+
+    def update(self):
+        w = self.world
+        g, virus, rng = w.g, w.virus, w.rng
+        w.daynum += 1
+        daynum = w.daynum
+        w.tick() # a new day for the profiler
+
+        if self.strategy != 'complete':
+            self.spread(daynum)
+
+        # symptom onset
+        onset = self.calendar.pop(daynum, 'onset')
+        if self.strategy == 'complete':
+            g.state[onset] = g.real[onset]
+            g.real[onset] = 0
+        else:
+            g.state[onset] = self.onset_x[onset] if self.strategy == 'partial' else 1
+            g.color[onset] = 'r'
+            later = self.trial_day[onset] > daynum
+            self.calendar.schedule('isolate', self.trial_day[onset[later]], onset[later])
+            self.isolate(np.concatenate([onset[~later], self.calendar.pop(daynum, 'isolate')]))
+        g.classify(onset, ed.HEALTH)
+        k = waiting(rng, self.onset_x[onset], self.outcome)
+        self.calendar.schedule('outcome', self.trial_day[onset] + k, onset)
+        w.tick('progression')
+
+        if self.strategy == 'time':
+            # release of the isolated healthy persons, before the tracing of the day
+            released = self.calendar.pop(daynum, 'release')
+            released = released[(self.release[released] == daynum) & g.alive[released] & (g.real[released] == 0)]
+            self.unisolate(released)
+
+            contacts, since = self.traced(onset, daynum)
+            keep = g.alive[contacts] & (g.real[contacts] != 0.5)
+            contacts, since = contacts[keep], since[keep]
+            healthy = g.real[contacts] == 0
+            day = daynum + np.maximum(1, virus.hidden_day - since[healthy])
+            healthy = contacts[healthy]
+            day = np.where(g.isolation[healthy] == 1, np.maximum(self.release[healthy], day), day) # isolated already
+            self.isolate(contacts)
+            self.release[healthy] = day
+            self.calendar.schedule('release', day, healthy)
+            w.tick('tracing', traced = len(contacts))
+
+        # recovery and death
+        due = self.calendar.pop(daynum, 'outcome')
+        x = self.onset_x[due] + daynum - self.trial_day[due]
+        recovered = rng.random(len(due)) < self.recovered[np.minimum(x, len(self.recovered) - 1)]
+        rec, died = due[recovered], due[~recovered]
+        g.state[rec] = 0.5 # The sick person recovered
+        g.real[rec] = 0.5
+        g.color[rec] = 'g'
+        g.classify(rec, ed.HEALTH)
+        if self.strategy != 'complete':
+            self.unisolate(rec)
+        w.tick('outcome')
+        g.removeNodes(died) # The sick person has probability to die
+        w.tick('removal', removed = len(died))
+        self.infected = self.infected[g.alive[self.infected] & (g.real[self.infected] >= 1)]
+        self.sync(daynum)
+        w.tick('progression')
+        w.record()
+
+    def traced(self, people, daynum):
+        # Outputs:
+        # contacts, since - the contacts of people within the last hidden_day days, each once with the least days
+        w = self.world
+        g, hidden = w.g, w.virus.hidden_day
+        contacts, since = g.touch_history.trace(people, daynum, 'min', hidden)
+        # the days before the touch history kept all the contacts of a person, drawn now
+        first = max(daynum - hidden + 1, 0)
+        days = np.maximum(self.known[people] - first, 0)
+        ids = np.repeat(people, days)
+        day = first + np.arange(len(ids)) - np.repeat(np.cumsum(days) - days, days)
+        pairs, rows = self.contacts(ids, 2 * self.mean, self.alive, len(g), index = True)
+        contacts = np.concatenate([contacts, pairs[:, 1]])
+        since = np.concatenate([since, daynum - day[rows]])
+        order = np.lexsort((since, contacts))
+        contacts, since = contacts[order], since[order]
+        first = np.concatenate([contacts[:1] == contacts[:1], contacts[1:] != contacts[:-1]])
+        return contacts[first], since[first]
+
+    def sync(self, daynum):
+        # ill days and states of the active persons, as Isolation.py keeps them, for observe() and the recorder
+        g = self.world.g
+        a = self.infected
+        before = (self.onset_day[a] > daynum) | (self.onset_day[a] < 0)
+        if self.strategy == 'complete':
+            g.state[a[~before]] = daynum + 1
+            return
+        g.real[a] = np.where(before, daynum - self.day0[a] + 2, self.onset_x[a] + daynum - self.trial_day[a] + 1)
+        if self.strategy == 'partial':
+            g.state[a] = np.where(before, 0, g.real[a])
+        else:
+            g.state[a] = np.where(before, 0, daynum - self.onset_day[a] + 2)
+
+    def snapshot(self):
+        return ed.snapshot(self.world)
+
+    def observe(self, s = None):
+        if s is None: # drawn from the model itself, not from a worker snapshot
+            s = self.snapshot()
+        t = 'persons: ' + str(self.n) + ', heathy: ' + str(s.hnum) + ', sick: ' + str(s.pnum) \
+                + ', recovery: ' + str(s.rnum) + ', death: ' + str(s.dnum) + ' - day: ' + str(s.daynum)
+        self.renderer.draw(s, self.layout.positions(s), t)
+
+    def run(self, worker = False):
+        # the shares of the phases are shown in the status bar when the model has a profiler
+        import pycxsimulator # Tk and matplotlib are loaded only for the GUI
+        status = self.profiler.summary if self.profiler is not None else None
+        pycxsimulator.GUI(worker = worker, statusFunc = status).start(func = [self.initialize, self.observe, self.update, self.snapshot])
+
+# Model 1
+class complete_isolation(engine):
+    strategy = 'complete'
+
+# Model 2
+class partial_isolation(engine):
+    strategy = 'partial'
+
+# Model 3
+class time_isolation(engine):
+    strategy = 'time'
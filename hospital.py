@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Hospital - beds and the waiting list of the hospital models
+The waiting list is an indexed binary heap of persons, the smallest ( key, id ) is admitted first, so the cost of
+a day depends on the number of arrivals, admissions and discharges and not on the size of the population.
+
+Class - waitingList
+
+Functions:
+push - put a person on the list, or change the key of a person already waiting ( decrease / increase key ).
+pop - take the first person off the list.
+remove - a waiting person leaves the list, e.g. recovered or dead before admission.
+pushMany, popMany, removeMany - the same for arrays of persons, popMany( k ) takes up to k persons.
+restore - the list from the heap and the keys of a checkpoint.
+With numba the hospital keeps its list in kernels.arrayWaitingList instead, the same functions on arrays.
+
+Class - hospital
+
+variable:
+v - volume of the hospital, the number of beds.
+num - # of patients in hospital.
+waiting - waiting list of the patients.
+offset - the first person of the hospital, the ward of replica k of an ensemble has the persons from k * n.
+
+Functions:
+wait - put patients on the waiting list with their keys.
+leave - patients recovered or died while waiting leave the list.
+discharge - patients in hospital recovered or died, their beds are free again.
+take - the first patients of the waiting list as long as there are free beds.
+fill - admit them, take and the columns of the population.
+
+Class - wards
+
+The hospitals of the K replicas of an ensemble, v beds for each replica, with the functions of hospital. The
+persons are handed on to the ward of their replica.
+
+create - a hospital, or the wards of an ensemble.
+"""
+
+import numpy as np
+import kernels
+
+# Creat waiting list class
+class waitingList:
+    def __init__(self, n):
+        self.heap = [] # persons, heap ordered by ( key, id )
+        self.pos = [-1] * n # position of each person in heap, -1: not waiting
+        self.key = [0] * n
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, i):
+        return self.pos[i] >= 0
+
+    def _less(self, a, b):
+        return (self.key[a], a) < (self.key[b], b)
+
+    def _swap(self, x, y):
+        heap = self.heap
+        heap[x], heap[y] = heap[y], heap[x]
+        self.pos[heap[x]] = x
+        self.pos[heap[y]] = y
+
+    def _up(self, x):
+        while x > 0:
+            parent = (x - 1) // 2
+            if not self._less(self.heap[x], self.heap[parent]):
+                break
+            self._swap(x, parent)
+            x = parent
+
+    def _down(self, x):
+        size = len(self.heap)
+        while True:
+            child = 2 * x + 1
+            if child >= size:
+                break
+            if child + 1 < size and self._less(self.heap[child + 1], self.heap[child]):
+                child += 1
+            if not self._less(self.heap[child], self.heap[x]):
+                break
+            self._swap(x, child)
+            x = child
+
+    def push(self, i, key):
+        if self.pos[i] >= 0: # already waiting, change the key
+            old = self.key[i]
+            self.key[i] = key
+            if (key, i) < (old, i):
+                self._up(self.pos[i])
+            else:
+                self._down(self.pos[i])
+            return
+        self.key[i] = key
+        self.heap.append(i)
+        self.pos[i] = len(self.heap) - 1
+        self._up(len(self.heap) - 1)
+
+    def pop(self):
+        i = self.heap[0]
+        self.remove(i)
+        return i
+
+    def remove(self, i):
+        x = self.pos[i]
+        if x < 0:
+            return
+        last = len(self.heap) - 1
+        if x != last:
+            self._swap(x, last)
+        self.heap.pop()
+        self.pos[i] = -1
+        if x < len(self.heap):
+            moved = self.heap[x]
+            self._up(x)
+            self._down(self.pos[moved])
+
+    def pushMany(self, ids, keys):
+        for i, key in zip(np.asarray(ids).tolist(), np.asarray(keys).tolist()):
+            self.push(i, key)
+
+    def removeMany(self, ids):
+        for i in np.asarray(ids).tolist():
+            self.remove(i)
+
+    def popMany(self, k):
+        return np.array([self.pop() for _ in range(min(k, len(self.heap)))], dtype = np.int64)
+
+    def restore(self, heap, key):
+        self.heap = list(heap)
+        self.key = list(key)
+        for x, i in enumerate(self.heap):
+            self.pos[i] = x
+
+# Creat hospital class
+class hospital:
+    def __init__(self, v, n, offset = 0):
+        self.v = v # volume of the hospital
+        self.num = 0 # the number of patients in hospital
+        self.waiting = (kernels.arrayWaitingList if kernels.ENABLED else waitingList)(n)
+        self.offset = offset
+
+    def free(self):
+        return self.v - self.num
+
+    def wait(self, ids, keys):
+        self.waiting.pushMany(np.asarray(ids) - self.offset, keys)
+
+    def leave(self, ids):
+        self.waiting.removeMany(np.asarray(ids) - self.offset)
+
+    def discharge(self, g, ids):
+        ids = dismiss(g, ids)
+        self.num -= len(ids)
+
+    def take(self):
+        admitted = self.waiting.popMany(self.v - self.num) + self.offset
+        self.num += len(admitted)
+        return admitted
+
+    def fill(self, g):
+        # Outputs:
+        # admitted - the patients admitted today, in the order of the waiting list
+        return admit(g, self.take())
+
+def admit(g, ids):
+    g.hospital[ids] = 1
+    g.isolation[ids] = 1
+    g.color[ids] = 'k'
+    g.classify(ids, ['isolated', 'hospitalized'])
+    return ids
+
+def dismiss(g, ids):
+    # Outputs:
+    # the ones of ids in hospital, out of it now
+    ids = ids[g.hospital[ids] == 1]
+    g.hospital[ids] = 0
+    g.isolation[ids] = 0
+    g.classify(ids, ['isolated', 'hospitalized'])
+    return ids
+
+# Creat wards class, a hospital for each replica of an ensemble
+class wards:
+    def __init__(self, v, n, replicas):
+        self.v = v
+        self.n = n # persons of each replica
+        self.hospitals = [hospital(v, n, k * n) for k in range(replicas)]
+
+    @property
+    def num(self):
+        return sum(h.num for h in self.hospitals)
+
+    def free(self):
+        return sum(h.free() for h in self.hospitals)
+
+    def split(self, ids, *columns):
+        # Outputs:
+        # ( hospital, ids, columns ) of each replica with persons in ids
+        ids = np.asarray(ids, dtype = np.int64)
+        replica = ids // self.n
+        if np.all(replica[1:] >= replica[:-1]): # mostly the ids of a set, in node order
+            order = np.arange(len(ids))
+        else:
+            order = np.argsort(replica, kind = 'stable')
+        cut = np.flatnonzero(np.diff(replica[order])) + 1
+        for group in np.split(order, cut) if len(ids) else []:
+            yield (self.hospitals[replica[group[0]]], ids[group]) + tuple(np.asarray(c)[group] for c in columns)
+
+    def wait(self, ids, keys):
+        for h, ids, keys in self.split(ids, keys):
+            h.wait(ids, keys)
+
+    def leave(self, ids):
+        for h, ids in self.split(ids):
+            h.leave(ids)
+
+    def discharge(self, g, ids):
+        ids = dismiss(g, ids)
+        for h, ids in self.split(ids):
+            h.num -= len(ids)
+
+    def fill(self, g):
+        admitted = [h.take() for h in self.hospitals if h.num < h.v and len(h.waiting)]
+        return admit(g, np.concatenate(admitted) if admitted else np.empty(0, dtype = np.int64))
+
+def create(v, n, replicas = 1):
+    return hospital(v, n) if replicas == 1 else wards(v, n, replicas)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Kernels - compiled loops of the sequential parts of a day
+Two parts of a day go person by person: the reduction of the touch history to the least / largest days since
+exposure of every contact ( contactLog.trace, feeding the min-update of iso_day in time isolation and the
+max-update of hos_order in hospital severity ), and the waiting list of the hospital, a binary heap pushed,
+popped and cut person by person. With numba installed both are compiled loops over arrays: the trace keeps the
+best days of each contact in a scratch column instead of sorting all the contacts, and the heap lives in arrays
+instead of Python lists.
+
+Without numba the functions below are plain Python, ENABLED is False and the callers keep their NumPy / list
+code, which is faster than these loops uncompiled. The plain functions are still run by check().
+
+variable:
+NUMBA - whether numba is installed.
+ENABLED - whether contactLog.trace and the new hospitals use the kernels, True with numba.
+
+Functions:
+traceSlot - best days since exposure of the contacts of people in one day of the touch history.
+trace - contactLog.trace with traceSlot, the same outputs.
+push, remove, take - the heap of the waiting list on arrays, for arrays of persons.
+check - the models with and without the kernels under a fixed seed, all outputs must be the same.
+
+Class - arrayWaitingList
+
+The waiting list of hospital.py on arrays ( heap, pos, key ), ordered by ( key, id ) in the same way.
+
+Example:
+python kernels.py
+"""
+
+import numpy as np
+
+try:
+    import numba
+    njit = numba.njit(cache = True)
+    NUMBA = True
+except ImportError:
+    NUMBA = False
+    def njit(func):
+        return func # plain Python
+
+ENABLED = NUMBA
+
+@njit
+def traceSlot(dst, lo, hi, since, largest, best, touched, count):
+    # Inputs:
+    # dst, lo, hi - contacts of one day, people's ranges [ lo, hi ) in them
+    # since - days since exposure of the day, largest - keep the max instead of the min
+    # best - best days of every person so far, -1: not touched
+    # touched - the touched persons in order of their first touch, count of them
+    # Outputs:
+    # count - touched persons after the day
+    for p in range(len(lo)):
+        for j in range(lo[p], hi[p]):
+            c = dst[j]
+            if best[c] < 0:
+                best[c] = since
+                touched[count] = c
+                count += 1
+            elif (since > best[c]) if largest else (since < best[c]):
+                best[c] = since
+    return count
+
+def trace(log, people, daynum, reduce = 'min', today = 0):
+    # the inputs and outputs of contactLog.trace
+    people = np.unique(np.asarray(people, dtype = np.int64))
+    slots = np.flatnonzero(log.day >= 0)
+    n = max([int(log.dst[slot].max()) + 1 for slot in slots if len(log.dst[slot])] + [0])
+    best = np.full(n, -1, dtype = np.int64)
+    touched = np.empty(n, dtype = np.int64)
+    count = 0
+    for slot in slots:
+        lo = np.searchsorted(log.src[slot], people, 'left')
+        hi = np.searchsorted(log.src[slot], people, 'right')
+        since = int(daynum - log.day[slot])
+        since = today if since == 0 else since
+        count = traceSlot(log.dst[slot], lo, hi, since, reduce == 'max', best, touched, count)
+    contacts = np.sort(touched[:count])
+    return contacts, best[contacts]
+
+# heap of ( key, id ), pos of each person in it, -1: not waiting
+@njit
+def less(key, a, b):
+    return key[a] < key[b] or (key[a] == key[b] and a < b)
+
+@njit
+def swap(heap, pos, x, y):
+    heap[x], heap[y] = heap[y], heap[x]
+    pos[heap[x]] = x
+    pos[heap[y]] = y
+
+@njit
+def up(heap, pos, key, x):
+    while x > 0:
+        parent = (x - 1) // 2
+        if not less(key, heap[x], heap[parent]):
+            break
+        swap(heap, pos, x, parent)
+        x = parent
+
+@njit
+def down(heap, pos, key, size, x):
+    while True:
+        child = 2 * x + 1
+        if child >= size:
+            break
+        if child + 1 < size and less(key, heap[child + 1], heap[child]):
+            child += 1
+        if not less(key, heap[child], heap[x]):
+            break
+        swap(heap, pos, x, child)
+        x = child
+
+@njit
+def push(heap, pos, key, size, ids, keys):
+    # Outputs:
+    # size - of the heap after ids were put on it, or got their new keys
+    for j in range(len(ids)):
+        i = ids[j]
+        if pos[i] >= 0: # already waiting, change the key
+            old = key[i]
+            key[i] = keys[j]
+            if keys[j] < old:
+                up(heap, pos, key, pos[i])
+            else:
+                down(heap, pos, key, size, pos[i])
+            continue
+        key[i] = keys[j]
+        heap[size] = i
+        pos[i] = size
+        size += 1
+        up(heap, pos, key, size - 1)
+    return size
+
+@njit
+def remove(heap, pos, key, size, ids):
+    for j in range(len(ids)):
+        i = ids[j]
+        x = pos[i]
+        if x < 0:
+            continue
+        last = size - 1
+        if x != last:
+            swap(heap, pos, x, last)
+        size -= 1
+        pos[i] = -1
+        if x < size:
+            moved = heap[x]
+            up(heap, pos, key, x)
+            down(heap, pos, key, size, pos[moved])
+    return size
+
+@njit
+def take(heap, pos, key, size, out):
+    # Outputs:
+    # size, count - the first count persons of the heap are taken into out
+    count = 0
+    while count < len(out) and size > 0:
+        i = heap[0]
+        out[count] = i
+        count += 1
+        last = size - 1
+        if last != 0:
+            swap(heap, pos, 0, last)
+        size -= 1
+        pos[i] = -1
+        if size > 0:
+            moved = heap[0]
+            up(heap, pos, key, 0)
+            down(heap, pos, key, size, pos[moved])
+    return size, count
+
+# Creat array waiting list class
+class arrayWaitingList:
+    def __init__(self, n):
+        self.items = np.empty(n, dtype = np.int64)
+        self.pos = np.full(n, -1, dtype = np.int64)
+        self.key = np.zeros(n)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, i):
+        return self.pos[i] >= 0
+
+    @property
+    def heap(self):
+        return self.items[:self.size]
+
+    def push(self, i, key):
+        self.pushMany([i], [key])
+
+    def pop(self):
+        return int(self.popMany(1)[0])
+
+    def remove(self, i):
+        self.removeMany([i])
+
+    def pushMany(self, ids, keys):
+        ids, keys = np.asarray(ids, dtype = np.int64), np.asarray(keys, dtype = float)
+        self.size = push(self.items, self.pos, self.key, self.size, ids, keys)
+
+    def removeMany(self, ids):
+        self.size = remove(self.items, self.pos, self.key, self.size, np.asarray(ids, dtype = np.int64))
+
+    def popMany(self, k):
+        out = np.empty(max(0, min(k, self.size)), dtype = np.int64)
+        self.size, count = take(self.items, self.pos, self.key, self.size, out)
+        return out[:count]
+
+    def restore(self, heap, key):
+        self.size = len(heap)
+        self.items[:self.size] = heap
+        self.key[:] = key
+        self.pos[:] = -1
+        self.pos[self.items[:self.size]] = np.arange(self.size)
+
+def check(seed = 0, n = 2000):
+    # Outputs:
+    # True when the kernels ( compiled or not ) give the same outputs as the NumPy / list code
+    global ENABLED
+    import Isolation
+    import HospitalAdmission
+    import recorder as rc
+    import epidemic as ed
+    import hospital as hs
+    saved = ENABLED # switched below, put back even when a comparison raises
+    try:
+        rng = np.random.default_rng(seed)
+        same = True
+
+        # the touch history of random days
+        log = ed.contactLog(14)
+        for day in range(20):
+            log.record(day, rng.integers(n, size = (3 * n, 2)))
+        people = rng.integers(n, size = n // 10)
+        for reduce in ('min', 'max'):
+            ENABLED = False
+            a, b = log.trace(people, 19, reduce, 14)
+            c, d = trace(log, people, 19, reduce, 14)
+            same &= np.array_equal(a, c) and np.array_equal(b, d)
+
+        # the waiting lists with the same pushes, key changes, removals and pops
+        lists = hs.waitingList(n), arrayWaitingList(n)
+        order = []
+        for w in lists:
+            r = np.random.default_rng(seed)
+            popped = []
+            for _ in range(50):
+                ids = r.integers(n, size = 40)
+                w.pushMany(ids, r.integers(-20, 20, size = 40) / 2)
+                w.removeMany(r.integers(n, size = 10))
+                popped.append(w.popMany(int(r.integers(15))))
+            order.append(np.concatenate(popped + [w.popMany(n)]))
+        same &= np.array_equal(order[0], order[1])
+
+        # whole runs
+        for model in (Isolation.time_isolation, HospitalAdmission.hospital_severity, HospitalAdmission.hospital_sequentiality):
+            runs = []
+            for ENABLED in (False, True):
+                params = {'v': n // 20} if model.__module__ == 'HospitalAdmission' else {}
+                m = model(n = n, seed = seed, recorder = rc.recorder(people = True), **params)
+                m.initialize()
+                while m.world.virus.pnum > 0:
+                    m.update()
+                runs.append((m.world.recorder.columns(), m.world.g))
+            (a, g), (b, h) = runs
+            same &= all(np.array_equal(a[key], b[key]) for key in a)
+            same &= np.array_equal(g.iso_day, h.iso_day) and np.array_equal(g.hos_order, h.hos_order)
+    finally:
+        ENABLED = saved
+    return bool(same)
+
+if __name__ == '__main__':
+    print('numba' if NUMBA else 'plain Python', 'kernels, same outputs:', check())
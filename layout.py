@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Layout - positions of the persons for observe()
+The positions are computed once and kept across days, so the nodes do not jump between frames and drawing a day
+does not start a new force simulation.
+
+Class - layout
+
+Inputs:
+mode - 'crowd': every crowd has a cell of a grid and its persons are placed around the center of the cell,
+       'spring': networkx spring layout, computed once and only relaxed a few iterations when the contacts change.
+crowds - the number of grid cells, e.g. the upper bound of crowd_num.
+iterations - iterations of the spring layout for a day with new contacts.
+
+Functions:
+positions - ( n, 2 ) array of the positions of all ids, only the persons who changed crowd are moved.
+pos - the positions of the alive persons as a dict for networkx.draw.
+"""
+
+import numpy as np
+
+GOLDEN = np.pi * (3 - np.sqrt(5)) # golden angle, spreads the persons of a crowd evenly on a disc
+
+# Creat layout class
+class layout:
+    def __init__(self, mode = 'crowd', crowds = 20, iterations = 5):
+        self.mode = mode
+        self.crowds = crowds
+        self.iterations = iterations
+        self.P = None # positions of all ids
+        self.loc = None # the crowds the positions were computed for
+        self.edges = None # the contacts the spring positions were computed for
+
+    def _centers(self, loc):
+        side = int(np.ceil(np.sqrt(self.crowds)))
+        return np.stack([loc % side, loc // side], axis = 1).astype(float)
+
+    def _offsets(self, ids):
+        # fixed place of every person inside the cell of its crowd, the same in every crowd
+        k = ids % 64
+        r = 0.4 * np.sqrt((k + 0.5) / 64)
+        return np.stack([r * np.cos(ids * GOLDEN), r * np.sin(ids * GOLDEN)], axis = 1)
+
+    def _crowd(self, g):
+        if len(g.loc) and g.loc.max() >= self.crowds: # more crowds than cells, a larger grid for everybody
+            self.crowds = int(g.loc.max()) + 1
+            self.P = None
+        if self.P is None or len(self.P) != g.n:
+            ids = np.arange(g.n)
+            self.P = self._centers(g.loc) + self._offsets(ids)
+        else:
+            moved = np.flatnonzero(g.loc != self.loc)
+            self.P[moved] = self._centers(g.loc[moved]) + self._offsets(moved)
+        self.loc = g.loc.copy()
+        return self.P
+
+    def _spring(self, g):
+        if self.P is not None and self.edges is not None and np.array_equal(self.edges, g.edges):
+            return self.P # no new contacts
+        import networkx as nx # only the spring mode needs it
+        graph = g.toGraph()
+        if self.P is None or len(self.P) != g.n:
+            pos = nx.spring_layout(graph)
+            self.P = np.zeros((g.n, 2))
+        else: # warm start from yesterday
+            pos = nx.spring_layout(graph, pos = {i: self.P[i] for i in graph.nodes}, iterations = self.iterations)
+        nodes = np.fromiter(pos.keys(), dtype = np.int64, count = len(pos))
+        if len(nodes):
+            self.P[nodes] = np.array(list(pos.values()))
+        self.edges = g.edges.copy()
+        return self.P
+
+    def positions(self, g):
+        return self._crowd(g) if self.mode == 'crowd' else self._spring(g)
+
+    def pos(self, g):
+        P = self.positions(g)
+        nodes = g.nodes
+        return dict(zip(nodes.tolist(), P[nodes]))
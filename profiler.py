@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Profiler - where the time of a day goes
+The update() of the models marks the end of each of its phases with world.tick( phase, **counts ), the time since
+the previous tick is added to the phase and the counts to the counters. Without a profiler in the world a tick is
+only the check of world.profiler, nothing is timed or counted.
+
+Phases:
+relink - new crowds and contacts ( counter contacts ).
+infection - infection of the healthy persons ( counter infections ).
+progression - symptoms, isolation and ill days of the patients.
+tracing - isolation / order of the contacts in the touch history ( counter traced ).
+admission - the waiting list and the beds of the hospital.
+outcome - recovery and death of the patients.
+removal - the dead persons leave the network ( counter removed ).
+
+Class - profiler
+
+Functions:
+tick - end of a phase, tick() without a phase starts a day.
+stats - seconds, share and mean per day of every phase and the totals of the counters.
+summary - the largest phases as a short line, e.g. for the status bar of the GUI.
+report - print the stats as a table.
+
+Example:
+m = Isolation.time_isolation(n = 100000, profiler = pf.profiler())
+...
+m.world.profiler.report()
+"""
+
+import time
+
+# Creat profiler class
+class profiler:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.days = 0
+        self.seconds = {}
+        self.counters = {}
+        self.last = None
+
+    def tick(self, phase = None, counts = None):
+        now = time.perf_counter()
+        if phase is None:
+            self.days += 1
+        elif self.last is not None:
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + now - self.last
+        if counts:
+            for key, value in counts.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+        self.last = now
+
+    def stats(self):
+        total = sum(self.seconds.values())
+        phases = {phase: {'seconds': s, 'share': s / total if total else 0.0, 'mean': s / max(self.days, 1)}
+                  for phase, s in sorted(self.seconds.items(), key = lambda item: -item[1])}
+        return {'days': self.days, 'seconds': total, 'phases': phases, 'counters': dict(self.counters)}
+
+    def summary(self, top = 3):
+        phases = self.stats()['phases']
+        return ', '.join('%s %d%%' % (phase, round(100 * p['share'])) for phase, p in list(phases.items())[:top])
+
+    def report(self):
+        s = self.stats()
+        print('%d days, %.3f s' % (s['days'], s['seconds']))
+        for phase, p in s['phases'].items():
+            print('  %-12s %9.4f s %5.1f %% %9.5f s / day' % (phase, p['seconds'], 100 * p['share'], p['mean']))
+        for key, value in s['counters'].items():
+            print('  %-12s %d' % (key, value))
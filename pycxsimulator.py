@@ -24,21 +24,24 @@ import matplotlib
 matplotlib.use('TkAgg')
 
 import pylab
+import threading
 
 ## version check added by Hiroki Sayama on 01/08/2019
 import sys
 if sys.version_info[0] == 3: # Python 3
     from tkinter import *
     from tkinter.ttk import Notebook
+    import queue
 else:                        # Python 2
     from Tkinter import *
     from ttk import Notebook
+    import Queue as queue
 
 
 class GUI:
 
     # Constructor
-    def __init__(self, title='PyCX Simulator', interval=0, stepSize=1, parameterSetters=[]):
+    def __init__(self, title='PyCX Simulator', interval=0, stepSize=1, parameterSetters=[], worker=False, queueSize=2, statusFunc=None):
 
         ## all GUI variables moved to inside constructor by Hiroki Sayama 10/09/2018
 
@@ -53,12 +56,22 @@ class GUI:
         self.modelFigure = None
         self.currentStep = 0
 
+        # worker mode: the model is stepped on a background thread which publishes snapshots and their status
+        # strings to a bounded queue, the window draws the latest snapshot at its own frame rate and stale ones
+        # are dropped, the window never calls statusFunc while the model is stepped
+        self.worker = worker
+        self.snapshots = queue.Queue(maxsize=queueSize)
+        self.workerThread = None
+        self.modelSnapshotFunc = None
+
         # initGUI() removed by Hiroki Sayama 10/09/2018
         
         #create root window
         self.rootWindow = Tk()
         self.statusText = StringVar(self.rootWindow, value=self.statusStr) # at this point, statusStr = ""
         # added "self.rootWindow" above by Hiroki Sayama 10/09/2018
+        # statusFunc - optional function of the model, its string is shown after the step in the status bar
+        self.statusFunc = statusFunc
         self.setStatusStr("Simulation not yet started")
 
         self.rootWindow.wm_title(self.titleText) # titleText = 'PyCX Simulator'
@@ -118,7 +131,7 @@ class GUI:
         
         self.stepScale = Scale(can,from_=1, to=50, resolution=1,command=self.changeStepSize,orient=HORIZONTAL, width=25,length=150)
         self.stepScale.set(self.stepSize)
-        self.showHelp(self.stepScale,"Skips model redraw during every [n] simulation steps\nResults in a faster model run.")
+        self.showHelp(self.stepScale,"Skips model redraw during every [n] simulation steps\nResults in a faster model run.\nIn worker mode: simulated steps per published frame.")
         self.stepScale.pack(side='left')
         
         can.pack(side='top')
@@ -178,6 +191,11 @@ class GUI:
             
     # <<<<< Init >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
     
+    def stepStr(self,step):
+        if self.statusFunc == None:
+            return "Step "+str(step)
+        return "Step "+str(step)+" - "+self.statusFunc()
+
     def setStatusStr(self,newStatus):
         self.statusStr = newStatus
         self.statusText.set(self.statusStr)        
@@ -203,7 +221,12 @@ class GUI:
     def runEvent(self):
         self.running = not self.running
         if self.running:
-            self.rootWindow.after(self.timeInterval,self.stepModel)
+            if self.worker:
+                self.workerThread = threading.Thread(target=self.workerLoop, daemon=True)
+                self.workerThread.start()
+                self.rootWindow.after(self.frameInterval(),self.consumeSnapshot)
+            else:
+                self.rootWindow.after(self.timeInterval,self.stepModel)
             self.runPauseString.set("Pause")
             self.buttonStep.configure(state=DISABLED)
             self.buttonReset.configure(state=DISABLED)
@@ -211,6 +234,7 @@ class GUI:
                 self.buttonSaveParameters.configure(state=NORMAL)
                 self.buttonSaveParametersAndReset.configure(state=DISABLED)     
         else:
+            self.stopWorker()
             self.runPauseString.set("Continue Run")
             self.buttonStep.configure(state=NORMAL)
             self.buttonReset.configure(state=NORMAL)
@@ -222,18 +246,70 @@ class GUI:
         if self.running:
             self.modelStepFunc()
             self.currentStep += 1
-            self.setStatusStr("Step "+str(self.currentStep))
+            self.setStatusStr(self.stepStr(self.currentStep))
             self.status.configure(foreground='black')
             if (self.currentStep) % self.stepSize == 0:
                 self.drawModel()
             self.rootWindow.after(int(self.timeInterval*1.0/self.stepSize),self.stepModel)
 
+    # <<<< worker mode >>>>
+    def workerLoop(self):
+        # runs on the worker thread, stepSize days per published snapshot
+        while self.running:
+            for i in range(self.stepSize):
+                self.modelStepFunc()
+                self.currentStep += 1
+            # the status string is made here, statusFunc reads the model while it is stepped
+            self.publish((self.currentStep, self.modelSnapshotFunc(), self.stepStr(self.currentStep)))
+
+    def publish(self, item):
+        while True:
+            try:
+                self.snapshots.put_nowait(item)
+                return
+            except queue.Full: # drop the oldest snapshot
+                try:
+                    self.snapshots.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def latestSnapshot(self):
+        latest = None
+        while True:
+            try:
+                latest = self.snapshots.get_nowait()
+            except queue.Empty:
+                return latest
+
+    def frameInterval(self):
+        return max(self.timeInterval, 20) # at most 50 frames per second
+
+    def consumeSnapshot(self):
+        latest = self.latestSnapshot()
+        if latest != None:
+            step, snapshot, status = latest
+            self.setStatusStr(status)
+            self.status.configure(foreground='black')
+            self.drawModel(snapshot)
+        if self.running:
+            self.rootWindow.after(self.frameInterval(),self.consumeSnapshot)
+
+    def stopWorker(self):
+        # wait for the days being stepped and show where the model stopped
+        if self.workerThread != None:
+            self.workerThread.join()
+            self.workerThread = None
+            latest = self.latestSnapshot()
+            if latest != None:
+                self.setStatusStr(latest[2])
+                self.drawModel(latest[1])
+
     def stepOnce(self):
         self.running = False
         self.runPauseString.set("Continue Run")
         self.modelStepFunc()
         self.currentStep += 1
-        self.setStatusStr("Step "+str(self.currentStep))
+        self.setStatusStr(self.stepStr(self.currentStep))
         self.drawModel()
         if len(self.parameterSetters) > 0:
             self.buttonSaveParameters.configure(state=NORMAL)
@@ -246,19 +322,25 @@ class GUI:
         self.setStatusStr("Model has been reset")
         self.drawModel()
 
-    def drawModel(self):
+    def drawModel(self, snapshot=None):
         pylab.ion() # bug fix by Alex Hill in 2013
         if self.modelFigure == None or self.modelFigure.canvas.manager.window == None:
             self.modelFigure = pylab.figure()
-        self.modelDrawFunc()
+            pylab.show() # bug fix by Hiroki Sayama in 2016, only needed when the figure is created
+        if snapshot == None:
+            self.modelDrawFunc() # models keep their artists and blit them, see renderer.py
+        else:
+            self.modelDrawFunc(snapshot)
         self.modelFigure.canvas.manager.window.update()
-        pylab.show() # bug fix by Hiroki Sayama in 2016
 
     def start(self,func=[]):
-        if len(func)==3:
+        if len(func)>=3:
             self.modelInitFunc = func[0]
             self.modelDrawFunc = func[1]
             self.modelStepFunc = func[2]            
+            if len(func)==4: # snapshot function for the worker mode
+                self.modelSnapshotFunc = func[3]
+            self.worker = self.worker and self.modelSnapshotFunc != None
             if (self.modelStepFunc.__doc__ != None and len(self.modelStepFunc.__doc__)>0):
                 self.showHelp(self.buttonStep,self.modelStepFunc.__doc__.strip())                
             if (self.modelInitFunc.__doc__ != None and len(self.modelInitFunc.__doc__)>0):
@@ -272,6 +354,9 @@ class GUI:
         self.rootWindow.mainloop()
 
     def quitGUI(self):
+        self.running = False
+        if self.workerThread != None:
+            self.workerThread.join()
         pylab.close('all')
         self.rootWindow.quit()
         self.rootWindow.destroy()
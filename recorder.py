@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Recorder - the daily numbers of a run, without the GUI
+The counters of every day are appended to preallocated NumPy buffers which grow by doubling, optionally with the
+state of every person. A run is written at once to one .npz file, one array per column, so a batch of many runs
+does not write its numbers row by row.
+
+Class - recorder
+
+Inputs:
+people - also keep the state of every person of every day, ( days, n ) columns.
+capacity - the number of days the buffers are allocated for at first.
+
+Columns:
+day, healthy, sick, recovery, death - daynum and the counters of the virus.
+isolated, hospital - the number of alive persons in isolation, in hospital.
+state, real, isolation, in_hospital, color, alive - the columns of the population ( people = True ), the color is
+kept as the index of it in COLORS.
+
+Functions:
+record - append the numbers of the world today, called at the end of initialize() and of every update().
+columns - the recorded days of every column.
+save - write the columns to one .npz file.
+load - read a saved run back as a dict of columns.
+
+Example:
+m = Isolation.time_isolation(recorder = rc.recorder())
+m.initialize()
+while m.world.virus.pnum > 0:
+    m.update()
+m.world.recorder.save('time_isolation.npz')
+"""
+
+import numpy as np
+
+COUNTERS = ['day', 'healthy', 'sick', 'recovery', 'death', 'isolated', 'hospital']
+PEOPLE = {'state': np.float32, 'real': np.float32, 'isolation': np.int8, 'in_hospital': np.int8,
+          'color': np.int8, 'alive': bool}
+COLORS = 'brygk' # healthy, symptomatical, asymptomatical, recovery, in hospital
+
+_CODE = np.zeros(128, dtype = np.int8)
+_CODE[[ord(c) for c in COLORS]] = np.arange(len(COLORS))
+
+def colorCodes(color):
+    # '<U1' colors of the population -> indexes in COLORS
+    return _CODE[np.asarray(color, dtype = '<U1').view(np.int32)]
+
+# Creat recorder class
+class recorder:
+    def __init__(self, people = False, capacity = 128):
+        self.people = people
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.days = 0
+        self.buffers = {}
+
+    def __len__(self):
+        return self.days
+
+    def _allocate(self, n):
+        size = self.capacity
+        self.buffers = {key: np.zeros(size, dtype = np.int64) for key in COUNTERS}
+        if self.people:
+            self.buffers.update({key: np.zeros((size, n), dtype = dtype) for key, dtype in PEOPLE.items()})
+
+    def _grow(self):
+        for key, buf in self.buffers.items():
+            new = np.zeros((2 * len(buf),) + buf.shape[1:], dtype = buf.dtype)
+            new[:len(buf)] = buf
+            self.buffers[key] = new
+
+    def record(self, w):
+        g, virus = w.g, w.virus
+        if not self.buffers:
+            self._allocate(g.n)
+        elif self.days == len(self.buffers['day']):
+            self._grow()
+        row, b = self.days, self.buffers
+        b['day'][row] = w.daynum
+        b['healthy'][row], b['sick'][row], b['recovery'][row], b['death'][row] = \
+            virus.hnum, virus.pnum, virus.rnum, virus.dnum
+        b['isolated'][row] = np.count_nonzero(g.isolation[g.alive])
+        b['hospital'][row] = np.count_nonzero(g.hospital[g.alive])
+        if self.people:
+            b['state'][row] = g.state
+            b['real'][row] = g.real
+            b['isolation'][row] = g.isolation
+            b['in_hospital'][row] = g.hospital
+            b['color'][row] = colorCodes(g.color)
+            b['alive'][row] = g.alive
+        self.days += 1
+
+    def columns(self):
+        return {key: buf[:self.days] for key, buf in self.buffers.items()}
+
+    def save(self, path, **meta):
+        # meta - numbers of the run saved along, e.g. model = 'time_isolation', seed = 1
+        np.savez_compressed(path, **self.columns(), **{'meta_' + k: np.asarray(v) for k, v in meta.items()})
+
+def load(path):
+    with np.load(path) as f:
+        return {key: f[key] for key in f.files}
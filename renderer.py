@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Renderer - persistent matplotlib drawing of the population for observe()
+The node scatter, the edge LineCollection and the title are created once per figure. Each frame only changes
+their offsets, colors and segments and blits them over the saved background, instead of clearing the axes and
+building every artist again with networkx.draw.
+
+Class - renderer
+
+Inputs:
+node_size - the size of the nodes.
+max_edges - edges are not drawn on days with more contacts than this, drawing them would dominate the frame.
+
+Functions:
+draw - draw the alive persons at positions P ( ( n, 2 ) array of all ids, e.g. from layout.py ) with a title.
+matplotlib is imported by the first draw, a renderer costs nothing to a run without observe().
+"""
+
+import numpy as np
+
+# Creat renderer class
+class renderer:
+    def __init__(self, node_size = 20, max_edges = 5000):
+        self.node_size = node_size
+        self.max_edges = max_edges
+        self.fig = None
+        self.background = None
+        self.cid = None
+
+    def _setup(self, P):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+        if self.cid is not None:
+            self.fig.canvas.mpl_disconnect(self.cid)
+        self.fig = plt.gcf()
+        ax = self.ax = plt.gca()
+        ax.cla()
+        ax.set_axis_off()
+        self.lines = LineCollection([], colors = 'k', linewidths = 1, animated = True)
+        ax.add_collection(self.lines)
+        self.nodes = ax.scatter([], [], s = self.node_size, animated = True, zorder = 2)
+        self.title = ax.set_title('', fontsize = 10, fontfamily = 'Times New Roman', animated = True)
+        low, high = P.min(axis = 0), P.max(axis = 0)
+        margin = 0.05 * np.maximum(high - low, 1e-9)
+        ax.set_xlim(low[0] - margin[0], high[0] + margin[0])
+        ax.set_ylim(low[1] - margin[1], high[1] + margin[1])
+        self.bounds = (low - margin, high + margin)
+        self.cid = self.fig.canvas.mpl_connect('draw_event', self._grab)
+        self.fig.canvas.draw()
+
+    def _grab(self, event = None):
+        # the background without the animated artists, taken again after every full draw ( e.g. resizing )
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+    def draw(self, g, P, title = ''):
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import to_rgba_array
+        nodes = g.nodes
+        if self.fig is None or self.fig is not plt.gcf() or self.ax is not plt.gca():
+            self._setup(P)
+        elif len(nodes) and (np.any(P[nodes] < self.bounds[0]) or np.any(P[nodes] > self.bounds[1])):
+            self._setup(P) # nodes moved out of the axes
+
+        self.nodes.set_offsets(P[nodes])
+        self.nodes.set_facecolors(to_rgba_array(g.color[nodes]))
+        self.nodes.set_edgecolors('face')
+        self.lines.set_segments(P[g.edges] if len(g.edges) <= self.max_edges else np.empty((0, 2, 2)))
+        self.title.set_text(title)
+
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        self.ax.draw_artist(self.lines)
+        self.ax.draw_artist(self.nodes)
+        self.ax.draw_artist(self.title)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
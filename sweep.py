@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Parameter Sweep - grids and Latin hypercubes over the model and virus parameters
+Every parameter set ( cell ) of the sweep is run N times with independent seeds, the child SeedSequences of the
+root seed with spawn key ( cell, replicate ); the seed of a row is an int label of its child. The jobs are shared
+by a process pool, an idle worker takes the next waiting job. Each finished job is appended to a checkpoint file
+at once, so an interrupted sweep started again with the same checkpoint only runs the jobs which are left. The checkpoint starts with the model, the root seed and a hash of the cells, a checkpoint of
+another sweep is refused. At the end one tidy table is written, one row per replicate.
+
+Parameters:
+n, density, d1, d2, crowd_num, v - parameters of the model classes.
+r - rate of volume of the hospital over population, v = int( n * r ), r and v only for the hospital models.
+hidden_day, coef_recovery, coef_death, coef_infected - coefficients of the virus, named as the attributes of
+epidemic.virus. coef_recovery is a [mean, sd] pair, so it can be a grid axis but not a Latin hypercube range.
+
+Functions:
+grid - all combinations of the given values, e.g. grid(d1 = [0.05, 0.1], r = [0.05, 0.1]).
+latinHypercube - Latin hypercube samples in the given ranges, e.g. latinHypercube(20, d1 = (0.05, 0.2)).
+runSweep - run the jobs of the cells, resume from the checkpoint and write the table.
+
+Example:
+cells = grid(d1 = [0.05, 0.1, 0.2], r = [0.05, 0.1])
+rows = runSweep('hospital_severity', cells, N = 20, checkpoint = 'severity.jsonl', output = 'severity.csv')
+
+python sweep.py spec.json
+spec.json - {"model": "time_isolation", "grid": {"d1": [0.05, 0.1]}, "N": 20, "output": "time.csv"}
+or {"model": "time_isolation", "lhs": {"d1": [0.05, 0.2], "coef_death": [41, 61]}, "samples": 30, ...}
+"""
+
+import os
+import csv
+import json
+import hashlib
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import batch
+import HospitalAdmission
+
+VIRUS = {'hidden_day': 'hidden_day', 'coef_recovery': 'recovery', 'coef_death': 'death', 'coef_infected': 'infected'}
+
+def grid(**axes):
+    # Outputs:
+    # cells - list of parameter dicts, the cartesian product of the values of every axis
+    keys = list(axes)
+    return [dict(zip(keys, values)) for values in itertools.product(*[axes[k] for k in keys])]
+
+def latinHypercube(samples, seed = None, **ranges):
+    # Inputs:
+    # samples - the number of cells
+    # ranges - parameter -> ( low, high ), integer bounds give integer values
+    # Outputs:
+    # cells - list of parameter dicts, every range is cut into samples strata and each stratum is used once
+    rng = np.random.default_rng(seed)
+    cells = [{} for _ in range(samples)]
+    for key, (low, high) in ranges.items():
+        x = low + (rng.permutation(samples) + rng.random(samples)) / samples * (high - low)
+        for cell, value in zip(cells, x):
+            cell[key] = int(round(value)) if isinstance(low, int) and isinstance(high, int) else float(value)
+    return cells
+
+def modelParams(cell):
+    # split a cell into the keyword arguments of the model class
+    params = {k: cell[k] for k in cell if k not in VIRUS and k != 'r'}
+    coef = {VIRUS[k]: cell[k] for k in VIRUS if k in cell}
+    if coef:
+        params['coef'] = coef
+    if 'r' in cell:
+        params['v'] = int(params.get('n', HospitalAdmission.n) * cell['r'])
+    return params
+
+def cellKey(cell):
+    # the content of a cell as a string, finished jobs are found by it
+    return json.dumps(cell, sort_keys = True, default = float)
+
+def _load(checkpoint):
+    header, done = None, {}
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError: # the last line of an interrupted sweep may be cut
+                    continue
+                if 'cell' in rec:
+                    done[(rec.get('params'), rec['replicate'])] = rec
+                else:
+                    header = rec
+        # cut the last line of an interrupted sweep, the jobs of the resumed sweep are appended after it
+        with open(checkpoint, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+    return header, done
+
+def runSweep(model, cells, N = 10, checkpoint = None, output = None, seed = None, workers = None, max_days = 365):
+    # Inputs:
+    # model - name of the model, see batch.MODELS
+    # cells - list of parameter dicts, e.g. from grid or latinHypercube
+    # N - the number of replicates of each cell
+    # checkpoint - file of the finished jobs, the sweep resumes from it
+    # output - csv file of the tidy table
+    # seed - root seed of the sweep, None: a random one, or the one saved in the checkpoint when resuming
+    # Outputs:
+    # rows - one dict per replicate: cell, replicate, seed, the parameters and the final numbers
+    # A checkpoint of another sweep ( model, root seed or cells ) raises ValueError, as do hospital parameters
+    # ( r, v ) for a model without a hospital.
+    if batch.MODELS[model] is not HospitalAdmission and any('r' in cell or 'v' in cell for cell in cells):
+        raise ValueError('%s has no hospital, r and v are parameters of the hospital models' % model)
+    keys = [cellKey(cell) for cell in cells]
+    digest = hashlib.sha1('\n'.join(keys).encode()).hexdigest()
+    header, done = _load(checkpoint)
+    if header is not None:
+        if 'entropy' not in header or header.get('model') != model or header.get('cells') != digest or \
+           (seed is not None and header.get('root') != seed):
+            raise ValueError('%s is the checkpoint of another sweep, remove it or choose another file' % checkpoint)
+        saved = header['entropy']
+    else:
+        saved = np.random.SeedSequence(seed).entropy
+        if checkpoint is not None:
+            with open(checkpoint, 'a') as f:
+                f.write(json.dumps({'entropy': saved, 'root': seed, 'model': model, 'cells': digest}) + '\n')
+
+    # a cell given twice is run once, with the seeds of its first place
+    first = {}
+    for c, key in enumerate(keys):
+        first.setdefault(key, c)
+    # every job runs on its own child SeedSequence of the root
+    jobs = []
+    for key, c in first.items():
+        for rep in range(N):
+            if (key, rep) not in done:
+                child = np.random.SeedSequence(saved, spawn_key = (c, rep))
+                jobs.append((c, rep, child, int(child.generate_state(1)[0])))
+
+    log = open(checkpoint, 'a') if checkpoint is not None else None
+    try:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            futures = {pool.submit(batch.replicate, model, child, max_days, **modelParams(cells[c])): (c, rep, s)
+                       for c, rep, child, s in jobs}
+            for future in as_completed(futures):
+                c, rep, s = futures[future]
+                rec = dict(future.result(), cell = c, params = keys[c], replicate = rep, seed = s)
+                done[(keys[c], rep)] = rec
+                if log is not None:
+                    log.write(json.dumps(rec) + '\n')
+                    log.flush()
+    finally:
+        if log is not None:
+            log.close()
+
+    rows = []
+    for c, cell in enumerate(cells):
+        for rep in range(N):
+            rec = done[(keys[c], rep)]
+            rows.append(dict(cell, cell = c, replicate = rep, seed = rec['seed'],
+                             **{key: rec[key] for key in batch.FIGURES}))
+    if output is not None:
+        writeTable(rows, output)
+    return rows
+
+def writeTable(rows, output):
+    keys = ['cell', 'replicate', 'seed']
+    for row in rows:
+        keys += [k for k in row if k not in keys and k not in batch.FIGURES]
+    keys += batch.FIGURES
+    with open(output, 'w', newline = '') as f:
+        writer = csv.DictWriter(f, fieldnames = keys)
+        writer.writeheader()
+        writer.writerows(rows)
+
+if __name__ == '__main__':
+    import sys
+    spec = json.load(open(sys.argv[1]))
+    if 'grid' in spec:
+        cells = grid(**spec['grid'])
+    else:
+        ranges = {k: tuple(v) for k, v in spec['lhs'].items()}
+        cells = latinHypercube(spec['samples'], spec.get('seed'), **ranges)
+    out = spec.get('output', 'sweep.csv')
+    runSweep(spec['model'], cells, spec.get('N', 10), spec.get('checkpoint', os.path.splitext(out)[0] + '.jsonl'),
+             out, spec.get('seed'), spec.get('workers'), spec.get('max_days', 365))
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Trajectory - the state of every person of every day, on disk
+The writer streams one row per day to a binary file: a 16 bytes header ( MAGIC and n ) followed by fixed size
+day rows of the columns below. Nothing of the past days is kept in memory, so a run of 1M persons over hundreds
+of days only needs its own population. The reader maps the file and gives ( days, n ) views of the columns, so
+any range of days and persons is sliced without reading the rest of the file.
+
+Columns:
+day - daynum of the row.
+state, real - float32, explicit and real state of persons.
+isolation, hospital, alive - int8.
+color - int8, the index of the color in recorder.COLORS.
+
+Class - trajectoryWriter
+
+A recorder for the models ( recorder = trajectoryWriter( path ) ), record() appends today, clear() starts the file
+again for a new run, close() when the run is done.
+
+Class - trajectory
+
+Functions:
+column - ( days, n ) view of one column, e.g. column( 'state' )[ 10:20, :1000 ].
+person - all the days of one column of the persons, e.g. person( 5, 'hospital' ).
+day - one row of one column, by daynum.
+colors - the color letters of a slice of the color column.
+
+Example:
+m = HospitalAdmission.hospital_severity(n = 1000000, v = 50000, recorder = tj.trajectoryWriter('severity.traj'))
+...
+m.world.recorder.close()
+t = tj.trajectory('severity.traj')
+sick = t.column('state')[:, :100] >= 1
+"""
+
+import os
+import numpy as np
+from recorder import COLORS, colorCodes
+
+MAGIC = b'EPITRJ01'
+HEADER = 16 # MAGIC and n
+
+def rowType(n):
+    # dtype of one day of n persons
+    return np.dtype([('day', '<i8'), ('state', '<f4', (n,)), ('real', '<f4', (n,)), ('isolation', 'i1', (n,)),
+                     ('hospital', 'i1', (n,)), ('alive', 'i1', (n,)), ('color', 'i1', (n,))])
+
+# Creat trajectory writer class
+class trajectoryWriter:
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+        self.days = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def clear(self):
+        self.close()
+        self.days = 0
+
+    def record(self, w):
+        g = w.g
+        if self.f is None:
+            self.f = open(self.path, 'wb')
+            self.f.write(MAGIC + np.int64(g.n).tobytes())
+            self.row = np.zeros(1, dtype = rowType(g.n)) # reused every day
+        row = self.row[0]
+        row['day'] = w.daynum
+        row['state'] = g.state
+        row['real'] = g.real
+        row['isolation'] = g.isolation
+        row['hospital'] = g.hospital
+        row['alive'] = g.alive
+        row['color'] = colorCodes(g.color)
+        self.f.write(self.row.tobytes())
+        self.days += 1
+
+    def flush(self):
+        if self.f is not None:
+            self.f.flush()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+# Creat trajectory reader class
+class trajectory:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            head = f.read(HEADER)
+        if head[:8] != MAGIC:
+            raise ValueError('%s is not a trajectory file' % path)
+        self.n = int(np.frombuffer(head[8:], dtype = '<i8')[0])
+        dtype = rowType(self.n)
+        days = (os.path.getsize(path) - HEADER) // dtype.itemsize # a cut last row of an interrupted run is ignored
+        self.rows = np.memmap(path, dtype = dtype, mode = 'r', offset = HEADER, shape = (days,))
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def days(self):
+        return self.rows['day']
+
+    def column(self, name):
+        return self.rows[name]
+
+    def person(self, i, name = 'state'):
+        return self.rows[name][:, i]
+
+    def day(self, daynum, name = 'state'):
+        return self.rows[name][int(np.searchsorted(self.days, daynum))]
+
+    def colors(self, codes):
+        return np.array(list(COLORS), dtype = '<U1')[codes]